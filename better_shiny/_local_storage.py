@@ -1,4 +1,6 @@
-from typing import TYPE_CHECKING
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Iterator
 
 from .utils import create_logger
 
@@ -8,30 +10,43 @@ if TYPE_CHECKING:
 
 logger = create_logger(__name__)
 
+# The session and dynamic function which are currently rendered. Every thread and asyncio task has its own context,
+# so sessions can be rendered concurrently. Tasks created during a render inherit the context of the render.
+_active_session_id: ContextVar[str | None] = ContextVar("active_session_id", default=None)
+_active_dynamic_function_id: ContextVar[str | None] = ContextVar("active_dynamic_function_id", default=None)
+# The active dynamic function itself, looked up once per render context
+_active_dynamic_function: ContextVar["DynamicFunction | None"] = ContextVar("active_dynamic_function", default=None)
+
 
 class LocalStorage:
     def __init__(self):
         from .app import BetterShiny
 
         self.app: BetterShiny | None = None
-        self._active_session_id: str | None = None
-        self._active_dynamic_function_id: str | None = None
 
     @property
     def active_session_id(self) -> str | None:
-        return self._active_session_id
-
-    @active_session_id.setter
-    def active_session_id(self, value: str | None):
-        self._active_session_id = value
+        return _active_session_id.get()
 
     @property
     def active_dynamic_function_id(self) -> str | None:
-        return self._active_dynamic_function_id
-
-    @active_dynamic_function_id.setter
-    def active_dynamic_function_id(self, value: str | None):
-        self._active_dynamic_function_id = value
+        return _active_dynamic_function_id.get()
+
+    @staticmethod
+    @contextmanager
+    def render_context(session_id: str | None, dynamic_function_id: str | None) -> Iterator[None]:
+        """
+        Set the active session and dynamic function for the current context and restore the previous ones afterwards.
+        """
+        session_token = _active_session_id.set(session_id)
+        dynamic_function_token = _active_dynamic_function_id.set(dynamic_function_id)
+        cached_dynamic_function_token = _active_dynamic_function.set(None)
+        try:
+            yield
+        finally:
+            _active_dynamic_function.reset(cached_dynamic_function_token)
+            _active_dynamic_function_id.reset(dynamic_function_token)
+            _active_session_id.reset(session_token)
 
     def active_session(self) -> "Session":
         if self.active_session_id is None:
@@ -40,9 +55,16 @@ class LocalStorage:
         return self.app.session_collector.get(self.active_session_id)
 
     def active_dynamic_function(self) -> "DynamicFunction":
+        dynamic_function = _active_dynamic_function.get()
+        if dynamic_function is not None:
+            return dynamic_function
+
         if self.active_dynamic_function_id is None:
             raise RuntimeError("No active dynamic function.")
-        return self.active_session().get_dynamic_function(self.active_dynamic_function_id)
+        dynamic_function = self.active_session().get_dynamic_function(self.active_dynamic_function_id)
+        # Values, event handlers, ... look up the dynamic function many times per render
+        _active_dynamic_function.set(dynamic_function)
+        return dynamic_function
 
 
 _local_storage: LocalStorage | None = None
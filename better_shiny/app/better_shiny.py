@@ -1,16 +1,21 @@
 import asyncio
+import contextvars
 import functools
+import inspect
+import mimetypes
 import os
 import random
 import threading
 import uuid
 from asyncio import AbstractEventLoop
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pathlib import Path
-from typing import Callable, Any, Coroutine
+from typing import Callable, Any, Coroutine, Set, TypeVar, Awaitable, Iterable
 
-from dominate.dom_tag import dom_tag
+from dominate import document
+from dominate.dom_tag import dom_tag, async_context_id
 from dominate.tags import html_tag
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, WebSocket, HTTPException, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import ValidationError
 from starlette.middleware.sessions import SessionMiddleware
@@ -29,16 +34,50 @@ from ..communication import (
     ResponseError,
     SessionCollector,
     ResponseReRender,
+    ResponsePatch,
     RequestEvent,
 )
+from ..communication.dom_patch import to_virtual_dom, diff_virtual_dom, render_virtual_dom
+from ..communication.dynamic_function import DynamicFunction
+from ..communication.session import Session
+from ..reactive import Value
+from ..themes import STYLE_SHEET_ROUTE
 from ..utils import create_logger
+from ..utils.blob_store import blob_store, BLOB_ROUTE
 from ..utils.logging import log_duration
 
 logger = create_logger(__name__)
 
+T = TypeVar("T")
+
 
 class BetterShiny:
-    def __init__(self, *args, **kwargs):
+    def __init__(
+            self,
+            *args,
+            max_frame_rate: float | None = 60,
+            render_executor: Executor | None = None,
+            prefetch_themes: Iterable[Callable | str] = (),
+            **kwargs,
+    ):
+        """
+        :param max_frame_rate: The maximal number of re-renders per second and session. Changes of reactive values in
+            between are collected and rendered together. None renders in the next iteration of the event loop.
+        :param render_executor: Executor (e.g. a ThreadPoolExecutor) the pages, dynamic functions and event handlers
+            are run in, so a slow render does not block the other sessions. The dynamic functions and event handlers
+            of a session never run concurrently. None runs them in the event loop.
+        :param prefetch_themes: Themes (e.g. theme_picnic) or style sheet urls which are loaded into the theme cache in
+            the background when the app starts, that way the first pages already link the cached copies instead of
+            the original urls.
+        :param args: Passed on to FastAPI.
+        :param kwargs: Passed on to FastAPI.
+        """
+        if isinstance(render_executor, ProcessPoolExecutor):
+            # The state of the dynamic functions (values, event handlers, ...) only exists in this process
+            raise ValueError("Renders cannot run in a ProcessPoolExecutor, use a ThreadPoolExecutor instead")
+        self.render_executor = render_executor
+        self._prefetch_themes = list(prefetch_themes)
+
         self.fast_api = FastAPI(*args, **kwargs)
         self.event_loop: AbstractEventLoop | None = None
         self.event_loop_thread = None
@@ -50,9 +89,11 @@ class BetterShiny:
         self.fast_api.add_middleware(SessionMiddleware, secret_key=random.randbytes(64))
         self.fast_api.on_event("startup")(self._set_event_loop)
         # Register session handler
-        self.session_collector = SessionCollector()
+        self.session_collector = SessionCollector(max_frame_rate)
         self.fast_api.add_api_websocket_route("/api/better-shiny-communication", self._ws_responder)
         self.fast_api.get("/api/better-shiny-communication/online")(self._online_check)
+        self.fast_api.get(f"{STYLE_SHEET_ROUTE}/{{name}}")(self._serve_style_sheet)
+        self.fast_api.get(f"{BLOB_ROUTE}/{{name}}")(self._serve_blob)
 
         self._local_storage = local_storage()
         if self._local_storage.app:
@@ -70,6 +111,18 @@ class BetterShiny:
         self.event_loop_thread = threading.current_thread()
         self._message_sender.start(self.event_loop)
         self.session_collector.start()
+        if self._prefetch_themes:
+            self._prefetch_task = self.event_loop.create_task(self._prefetch_theme_style_sheets())
+
+    async def _prefetch_theme_style_sheets(self) -> None:
+        # Imported here, so httpx is only imported by apps which use themes
+        from ..themes import prefetch_themes
+
+        try:
+            await prefetch_themes(self._prefetch_themes)
+        except Exception as e:
+            logger.error("Error while prefetching the themes:")
+            logger.exception(e)
 
     async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         await self.fast_api(scope, receive, send)
@@ -89,11 +142,21 @@ class BetterShiny:
             async def new_call(*args, **kwargs) -> DominatorResponse:
                 session_id = str(uuid.uuid4())
                 self.session_collector.add(session_id)
-                self._local_storage.active_session_id = session_id
                 logger.info(f"Request {session_id} started")
-                html = fn(*args, **kwargs)
+                if inspect.iscoroutinefunction(fn):
+                    with self._local_storage.render_context(session_id, None):
+                        html = await fn(*args, **kwargs)
+                    self._remember_page_render(session_id, html)
+                else:
+
+                    def render_page() -> Any:
+                        page_html = fn(*args, **kwargs)
+                        # The conversion for the diffs runs in the executor as well
+                        self._remember_page_render(session_id, page_html)
+                        return page_html
+
+                    html = await self._run_in_render_context(session_id, None, render_page)
                 logger.info(f"Request {session_id} ended")
-                self._local_storage.active_session_id = None
                 response = DominatorResponse(html)
                 response.set_cookie(
                     "better_shiny_session_id",
@@ -107,10 +170,42 @@ class BetterShiny:
 
         return wrapper
 
+    def _remember_page_render(self, session_id: str, html: Any) -> None:
+        """
+        Store the content of the dynamic functions on the page, so their first re-render is sent as a patch as well.
+        """
+        # Pages may return a tuple of the head and the body, invalid results are reported by the response
+        content = html[1] if isinstance(html, (tuple, list)) and len(html) == 2 else html
+        if isinstance(content, document):
+            content = content.body
+        if isinstance(content, RenderResult):
+            self.session_collector.get(session_id).remember_render(None, to_virtual_dom(content))
+
     @staticmethod
     def _online_check() -> bool:
         return True
 
+    @staticmethod
+    def _serve_style_sheet(name: str) -> Response:
+        # Imported here, so httpx is only imported by apps which use themes
+        from ..themes._theme_cache import theme_cache
+
+        style_sheet = theme_cache.get_asset(name)
+        if style_sheet is None:
+            raise HTTPException(status_code=404)
+        # The name contains the hash of the content, so the style sheet never changes
+        headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{name}"'}
+        return Response(style_sheet, media_type="text/css", headers=headers)
+
+    @staticmethod
+    def _serve_blob(name: str) -> Response:
+        data = blob_store.get(name)
+        if data is None:
+            raise HTTPException(status_code=404)
+        # The name contains the hash of the content, so the blob never changes
+        headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{name}"'}
+        return Response(data, media_type=mimetypes.guess_type(name)[0], headers=headers)
+
     async def _ws_responder(self, websocket: WebSocket) -> None:
         # get session cooke better_shiny_session
         session_id = websocket.headers.get("cookie", "").split("better_shiny_session_id=")[-1].split(";")[0]
@@ -125,7 +220,7 @@ class BetterShiny:
             return
 
         await websocket.accept()
-        session.websocket = websocket
+        session.connect(websocket)
 
         while True:
             try:
@@ -134,6 +229,7 @@ class BetterShiny:
                 parsed_data: BetterShinyRequestsType = BetterShinyRequests(**json_data).root
             except (WebSocketDisconnect, ConnectionClosedError):
                 # Connection closed, so we can stop the loop
+                self._message_sender.remove(websocket)
                 self.session_collector.remove(session_id)
                 break
             # Pydantic exception
@@ -143,20 +239,22 @@ class BetterShiny:
                 continue
             try:
                 # Delegate the client request to the correct dynamic function
-                self._delegate_to_dynamic_function(parsed_data, websocket)
+                await self._delegate_to_dynamic_function(parsed_data, websocket)
             except Exception as e:
                 logger.error("Server error:")
                 logger.exception(e)
 
-    def _delegate_to_dynamic_function(self, parsed_data: BetterShinyRequestsType, websocket: WebSocket) -> None:
+    async def _delegate_to_dynamic_function(
+            self, parsed_data: BetterShinyRequestsType, websocket: WebSocket
+    ) -> None:
         # switch between the different types of parsed_data
         match parsed_data:
             case RequestReRender():
                 logger.info(f"Received request to re-render {parsed_data.id}")
-                self._handle_re_render_request(parsed_data, websocket)
+                await self._handle_re_render_request(parsed_data, websocket)
             case RequestEvent():
                 logger.info(f"Received request to handle event {parsed_data.id}")
-                self._handle_event_request(parsed_data, websocket)
+                await self._handle_event_request(parsed_data, websocket)
             case _:
                 logger.warning(f"Unknown request type: {parsed_data}")
                 self._message_sender.queue_message(
@@ -167,36 +265,202 @@ class BetterShiny:
                     ),
                 )
 
-    def _handle_event_request(self, parsed_data: RequestEvent, websocket: WebSocket) -> None:
+    async def _run_in_render_context(
+            self, session_id: str, dynamic_function_id: str | None, fn: Callable[[], T]
+    ) -> T:
+        """
+        Run the function in the render executor, with the session and dynamic function set as active ones.
+        """
+
+        def run() -> T:
+            with self._local_storage.render_context(session_id, dynamic_function_id):
+                return fn()
+
+        if self.render_executor is None:
+            return run()
+        # Executors do not propagate the context by themselves
+        context = contextvars.copy_context()
+        return await self.event_loop.run_in_executor(self.render_executor, context.run, run)
+
+    def _create_task_in_render_context(
+            self, session_id: str, dynamic_function_id: str, fn: Callable[[], Awaitable[None]]
+    ) -> asyncio.Task:
+        """
+        Run the coroutine function in a task on the event loop, with the session and dynamic function set as active
+        ones. Errors are logged.
+        """
+
+        async def run() -> None:
+            # dominate keeps the elements which are currently built per context. Every task needs its own one,
+            # otherwise elements of concurrent renders are added to each other.
+            async_context_id.set(None)
+            with self._local_storage.render_context(session_id, dynamic_function_id):
+                try:
+                    await fn()
+                except Exception as e:
+                    logger.error(f"Error in {dynamic_function_id}:")
+                    logger.exception(e)
+
+        return self.event_loop.create_task(run(), context=contextvars.copy_context())
+
+    async def _handle_event_request(self, parsed_data: RequestEvent, websocket: WebSocket) -> None:
         session_id = websocket.headers.get("cookie", "").split("better_shiny_session_id=")[-1].split(";")[0]
-        # Prepare and teardown the local storage for the dynamic function execution
-        self._local_storage.active_session_id = session_id
-        self._local_storage.active_dynamic_function_id = parsed_data.id
-        session = self._local_storage.active_session()
+        session = self.session_collector.get(session_id)
         dynamic_function = session.get_dynamic_function(parsed_data.id)
         handler = log_duration(dynamic_function.call_event, f"Event {parsed_data.event_handler_id}")
-        handler(parsed_data.event_handler_id, parsed_data.event)
-        self._local_storage.active_dynamic_function_id = None
-        self._local_storage.active_session_id = None
+        async with session.render_lock:
+            result = await self._run_in_render_context(
+                session_id, parsed_data.id, lambda: handler(parsed_data.event_handler_id, parsed_data.event)
+            )
+
+        if inspect.isawaitable(result):
+            # Async event handlers run in the background, so they do not hold back the next requests of the client
+
+            async def handle_async() -> None:
+                await result
+
+            handle_async = log_duration(handle_async, f"Event {parsed_data.event_handler_id}")
+            dynamic_function.add_task(self._create_task_in_render_context(session_id, parsed_data.id, handle_async))
 
-    def _handle_re_render_request(self, parsed_data: RequestReRender, websocket: WebSocket) -> None:
+    async def _handle_re_render_request(self, parsed_data: RequestReRender, websocket: WebSocket) -> None:
         session_id = websocket.headers.get("cookie", "").split("better_shiny_session_id=")[-1].split(";")[0]
-        self._rerender_component(session_id, parsed_data.id, websocket)
+        # The client explicitly asked for the content, so it cannot be patched
+        await self._rerender_component(session_id, parsed_data.id, websocket, patch=False)
 
-    def _rerender_component(self, session_id: str, dynamic_function_id: str, websocket: WebSocket) -> None:
-        # Prepare and teardown the local storage for the dynamic function execution
-        self._local_storage.active_session_id = session_id
-        self._local_storage.active_dynamic_function_id = dynamic_function_id
-        dynamic_function = self._local_storage.active_dynamic_function()
-        html = log_duration(dynamic_function, f"Re-rendering {dynamic_function.name}")()
-        self._local_storage.active_dynamic_function_id = None
-        self._local_storage.active_session_id = None
+    async def _rerender_component(
+            self, session_id: str, dynamic_function_id: str, websocket: WebSocket, patch: bool = True
+    ) -> None:
+        session = self.session_collector.get(session_id)
+        if session.has_dynamic_function(dynamic_function_id):
+            if session.get_dynamic_function(dynamic_function_id).is_async:
+                self._rerender_async_component(session, dynamic_function_id, websocket, patch)
+                return
 
+        def render() -> ResponseReRender | ResponsePatch | None:
+            if not session.has_dynamic_function(dynamic_function_id) and patch:
+                # Unmounted by the render of its parent, which ran while waiting for the lock
+                return None
+            dynamic_function = session.get_dynamic_function(dynamic_function_id)
+            html = log_duration(dynamic_function.render, f"Re-rendering {dynamic_function.name}")()
+            if not self._commit_render(dynamic_function_id, dynamic_function, html, patch):
+                return None
+            # The diff is computed in the executor as well
+            return self._create_render_message(session, dynamic_function_id, html, patch)
+
+        async with session.render_lock:
+            message = await self._run_in_render_context(session_id, dynamic_function_id, render)
+        if message is not None:
+            self._message_sender.queue_message(websocket, message)
+
+    def _rerender_async_component(
+            self, session: Session, dynamic_function_id: str, websocket: WebSocket, patch: bool
+    ) -> None:
+        """
+        Async dynamic functions are rendered in their own task, so renders waiting for I/O do not block each other.
+        A render which is still running when the next one starts is cancelled, only the latest result is sent.
+        Only the commit of the result holds the render lock of the session, like every other render.
+        """
+        dynamic_function = session.get_dynamic_function(dynamic_function_id)
+        superseded = dynamic_function.render_task
+        if superseded is not None:
+            superseded.cancel()
+
+        async def render() -> None:
+            if superseded is not None:
+                # Let the cancelled render clean up before the new one starts
+                await asyncio.wait([superseded])
+            html = await log_duration(dynamic_function.render_async, f"Re-rendering {dynamic_function.name}")()
+            try:
+                await session.render_lock.acquire()
+            except BaseException:
+                # Cancelled while waiting for the lock, the render was not committed
+                dynamic_function.abort_render()
+                raise
+            try:
+                if not self._commit_render(dynamic_function_id, dynamic_function, html, patch):
+                    return
+                message = self._create_render_message(session, dynamic_function_id, html, patch)
+            finally:
+                session.render_lock.release()
+            if message is not None:
+                self._message_sender.queue_message(websocket, message)
+
+        task = self._create_task_in_render_context(session.session_id, dynamic_function_id, render)
+        dynamic_function.render_task = task
+        dynamic_function.add_task(task)
+
+    def _commit_render(
+            self, dynamic_function_id: str, dynamic_function: DynamicFunction, html: Any, patch: bool
+    ) -> bool:
+        """
+        Commit the result of a render, unless it is superseded by a render which is scheduled already. A superseded
+        result is dropped before it unmounts or creates children and replaces the event handlers, that way the server
+        state keeps matching the content the client displays.
+        :return: False if the result was dropped.
+        """
+        try:
+            self._assert_render_result(dynamic_function_id, html)
+        except ValueError:
+            dynamic_function.abort_render()
+            raise
+        # The client explicitly asked for the content if it is not patched, so it is always sent
+        if dynamic_function.commit_render(html, supersedable=patch):
+            return True
+        logger.info(f"Dropping the outdated render of {dynamic_function.name}")
+        return False
+
+    @staticmethod
+    def _assert_render_result(dynamic_function_id: str, html: Any) -> None:
         if not isinstance(html, RenderResult):
             raise ValueError(
                 f"Dynamic function {dynamic_function_id} returned invalid type {type(html)} instead of RenderResult"
             )
-        html = html.render()
-        self._message_sender.queue_message(
-            websocket, ResponseReRender(type="rerender@response", html=html, id=dynamic_function_id)
-        )
+
+    def _update_bindings(
+            self, session_id: str, dynamic_function_id: str, values: Set[Value], websocket: WebSocket
+    ) -> None:
+        session = self.session_collector.get(session_id)
+        dynamic_function = session.get_dynamic_function(dynamic_function_id)
+        for message in dynamic_function.binding_messages(values):
+            self._message_sender.queue_message(websocket, message)
+
+    def _resync_message(self, websocket: WebSocket, dynamic_function_id: str) -> ResponseReRender | None:
+        """
+        The complete content of the dynamic function as the server assumes the client displays it, which replaces
+        messages the client did not receive.
+        :return: None if the content is unknown, because the session or the dynamic function does not exist anymore.
+        """
+        session_id = websocket.headers.get("cookie", "").split("better_shiny_session_id=")[-1].split(";")[0]
+        try:
+            session = self.session_collector.get(session_id)
+        except ValueError:
+            return None
+        html = session.current_html(dynamic_function_id)
+        if html is None:
+            return None
+        return ResponseReRender(type="rerender@response", html=html, id=dynamic_function_id)
+
+    @staticmethod
+    def _create_render_message(
+            session: Session, dynamic_function_id: str, html: RenderResult, patch: bool
+    ) -> ResponseReRender | ResponsePatch | None:
+        """
+        Diff the new render result against the content the client currently displays and create the patches which
+        transform it. Falls back to the full html if the client content is unknown or the patches would be larger.
+        :return: The message to send, or None if the client is already up to date.
+        """
+        tree = to_virtual_dom(html)
+        previous = session.previous_render(dynamic_function_id)
+        patches = diff_virtual_dom(previous, tree, session.previous_render) if patch and previous is not None else None
+        session.remember_render(dynamic_function_id, tree)
+
+        if patches is not None:
+            if not patches:
+                return None
+
+            patch_size = sum(len(p.model_dump_json()) for p in patches)
+            # Only render the complete html if it could actually be smaller than the patches
+            if patch_size < 1024 or patch_size < len(render_virtual_dom(tree)):
+                return ResponsePatch(type="patch@response", id=dynamic_function_id, patches=patches)
+
+        return ResponseReRender(type="rerender@response", html=html.render(), id=dynamic_function_id)
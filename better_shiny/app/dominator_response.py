@@ -69,14 +69,26 @@ class DominatorResponse(HTMLResponse):
 
 
 def get_head_only_elements(root: RenderResult) -> Iterator[dom_tag]:
-    # Iterate over every element in the body and the children of the body
-    for element in root:
+    """
+    Find the head only elements (title, meta, link, base) in the body and remove them from it, so they can be moved
+    into the head. Elements inside the outlet of a dynamic function stay where they are: the server diffs the next
+    render of the dynamic function against the content of its outlet, and a theme which is switched by a dynamic
+    function replaces its link in the outlet.
+    """
+    # Iterate over every element in the body and the children of the body. Iterate over a copy, because the elements
+    # are removed while iterating.
+    for element in list(root):
         # And find the elements that are head only elements
         # "title", "meta", "link", "base",
         if type(element) in (title, meta, link, base):
             yield element
             # Then remove them from the content of the body
             root.remove(element)
+        # The content of dynamic functions is patched in place when they re-render, so it has to stay where it is.
         # If the element has children, we recursively call this function
-        elif isinstance(element, dom_tag) and len(element.children):
+        elif (
+                isinstance(element, dom_tag)
+                and len(element.children)
+                and element.attributes.get("data-server-rendered") != "true"
+        ):
             yield from get_head_only_elements(element)
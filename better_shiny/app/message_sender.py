@@ -1,11 +1,14 @@
 import asyncio
+import functools
 from asyncio import AbstractEventLoop
-from typing import Tuple, TYPE_CHECKING
+from collections import deque
+from typing import Callable, Deque, Dict, TYPE_CHECKING
 
 from pydantic import BaseModel
 from starlette.websockets import WebSocket, WebSocketDisconnect
 from websockets.exceptions import ConnectionClosedError
 
+from ..communication import ResponseBinding, ResponsePatch, ResponseReRender
 from ..utils import create_logger
 
 if TYPE_CHECKING:
@@ -14,27 +17,105 @@ if TYPE_CHECKING:
 logger = create_logger(__name__)
 
 
-class MessageSender:
-    def __init__(self, app: "BetterShiny"):
-        self._messages_to_send: asyncio.Queue[Tuple[WebSocket, BaseModel]] = asyncio.Queue()
+class _ClientQueue:
+    """
+    The messages which still have to be sent to a single websocket. Every client queue is drained by its own task, so
+    a slow client does not delay the messages of the other clients.
+    """
 
-    def start(self, event_loop: AbstractEventLoop) -> None:
-        # Run the _message_sender in the event loop. Do not wait for it to finish.
-        event_loop.create_task(self._message_sender())
+    def __init__(self, websocket: WebSocket, max_size: int, resync: Callable[[str], ResponseReRender | None]):
+        self._websocket = websocket
+        self._max_size = max_size
+        # Creates the complete current content of a dynamic function, None if the dynamic function does not exist
+        self._resync = resync
+        self._messages: Deque[BaseModel] = deque()
+        self._has_messages = asyncio.Event()
+
+    def put(self, message: BaseModel) -> None:
+        if isinstance(message, ResponseReRender):
+            # The complete html supersedes everything that is still queued for the dynamic function
+            self._messages = deque(m for m in self._messages if not _is_render_of(m, message.id))
+        elif isinstance(message, ResponsePatch) and self._messages and _is_patch_of(self._messages[-1], message.id):
+            # Consecutive patches of the same dynamic function are sent as one message
+            queued = self._messages.pop()
+            message = ResponsePatch(type="patch@response", id=message.id, patches=[*queued.patches, *message.patches])
+        elif isinstance(message, ResponseBinding):
+            # Only the latest value of a binding is relevant
+            self._messages = deque(m for m in self._messages if not _is_same_binding(m, message))
+
+        if len(self._messages) >= self._max_size:
+            # The client does not keep up
+            logger.warning(f"Message queue of client {self._websocket.client} is full, dropping the oldest message")
+            dropped = self._messages.popleft()
+            if isinstance(dropped, (ResponseReRender, ResponsePatch)):
+                # The server assumes that the client applied the dropped message, so the following patches would be
+                # applied to the wrong content. All messages of the dynamic function, including the new one, are
+                # replaced by its complete current content.
+                self._messages = deque(m for m in self._messages if not _is_render_of(m, dropped.id))
+                if _is_render_of(message, dropped.id):
+                    message = None
+                rerender = self._resync(dropped.id)
+                if rerender is not None:
+                    self._messages.append(rerender)
+
+        if message is not None:
+            self._messages.append(message)
+        self._has_messages.set()
 
-    async def _message_sender(self):
+    async def drain(self) -> None:
         while True:
-            websocket, message = await self._messages_to_send.get()
-            try:
-                dumped_message = message.model_dump()
-                await websocket.send_json(dumped_message)
-                logger.debug(f"Sent message to client")
-            except (WebSocketDisconnect, ConnectionClosedError):
-                pass
-            except Exception as e:
-                logger.error(e)
-            finally:
-                self._messages_to_send.task_done()
+            await self._has_messages.wait()
+            while self._messages:
+                message = self._messages.popleft()
+                try:
+                    await self._websocket.send_json(message.model_dump())
+                    logger.debug(f"Sent message to client")
+                except (WebSocketDisconnect, ConnectionClosedError):
+                    return
+                except Exception as e:
+                    logger.error(e)
+            self._has_messages.clear()
+
+
+def _is_render_of(message: BaseModel, dynamic_function_id: str) -> bool:
+    return isinstance(message, (ResponseReRender, ResponsePatch)) and message.id == dynamic_function_id
+
+
+def _is_same_binding(message: BaseModel, binding: ResponseBinding) -> bool:
+    return isinstance(message, ResponseBinding) and (message.id, message.attribute) == (binding.id, binding.attribute)
+
+
+def _is_patch_of(message: BaseModel, dynamic_function_id: str) -> bool:
+    return isinstance(message, ResponsePatch) and message.id == dynamic_function_id
+
+
+class MessageSender:
+    def __init__(self, app: "BetterShiny", max_queue_size: int = 1000):
+        self._app = app
+        self._max_queue_size = max_queue_size
+        self._event_loop: AbstractEventLoop | None = None
+        self._queues: Dict[WebSocket, _ClientQueue] = {}
+        self._tasks: Dict[WebSocket, asyncio.Task] = {}
+
+    def start(self, event_loop: AbstractEventLoop) -> None:
+        self._event_loop = event_loop
 
     def queue_message(self, websocket: WebSocket, message: BaseModel) -> None:
-        self._messages_to_send.put_nowait((websocket, message))
+        if websocket not in self._queues:
+            # noinspection PyProtectedMember
+            resync = functools.partial(self._app._resync_message, websocket)
+            queue = _ClientQueue(websocket, self._max_queue_size, resync)
+            self._queues[websocket] = queue
+            # Run the drain task in the event loop. Do not wait for it to finish.
+            self._tasks[websocket] = self._event_loop.create_task(queue.drain())
+
+        self._queues[websocket].put(message)
+
+    def remove(self, websocket: WebSocket) -> None:
+        """
+        Stop sending messages to the websocket and drop the messages that are still queued.
+        """
+        self._queues.pop(websocket, None)
+        task = self._tasks.pop(websocket, None)
+        if task is not None:
+            task.cancel()
@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import html
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from dominate.dom_tag import dom_tag
+from dominate.tags import html_tag
+from dominate.util import container, text
+
+from .messages import (
+    Patch,
+    PatchInsertChild,
+    PatchRemoveAttribute,
+    PatchRemoveChild,
+    PatchReplace,
+    PatchReplaceText,
+    PatchSetAttribute,
+    PatchSetHtml,
+)
+
+Path = List[int]
+
+
+@dataclass
+class VText:
+    # The text is stored the way dominate renders it (already escaped)
+    html: str
+
+    @property
+    def is_significant(self) -> bool:
+        # Whitespace only text nodes are created by pretty printing, so they are not addressable by patches
+        return bool(self.html.strip())
+
+    def render(self) -> str:
+        return self.html
+
+
+@dataclass
+class VRaw:
+    html: str
+    is_significant = True
+
+    def render(self) -> str:
+        return self.html
+
+
+@dataclass
+class VElement:
+    tag: str
+    attributes: Dict[str, str]
+    children: List[VNode]
+    is_single: bool = False
+    # Elements which do not render their content in a pretty way (pre, script, style, ...) or contain raw html
+    # cannot be diffed child by child
+    is_opaque: bool = False
+    is_significant = True
+
+    @property
+    def boundary_id(self) -> str | None:
+        """
+        The id of the dynamic function this element is the outlet of.
+        """
+        if self.attributes.get("data-server-rendered") == "true":
+            return self.attributes.get("id")
+        return None
+
+    @property
+    def is_lazy(self) -> bool:
+        return self.attributes.get("data-lazy") == "true"
+
+    def render_children(self) -> str:
+        return render_virtual_dom(self.children)
+
+    def render(self) -> str:
+        if self.is_single:
+            return self.render_start_tag()
+        return f"{self.render_start_tag()}{self.render_children()}</{self.tag}>"
+
+    def render_start_tag(self) -> str:
+        attributes = "".join(f' {name}="{html.escape(value)}"' for name, value in self.attributes.items())
+        return f"<{self.tag}{attributes}>"
+
+
+VNode = VText | VRaw | VElement
+
+
+def to_virtual_dom(node: dom_tag | str) -> List[VNode]:
+    """
+    Convert a dominate tree into a list of virtual nodes which can be diffed against each other.
+    Containers are flattened and adjacent text nodes are merged, the same way the browser does it when parsing the
+    rendered html.
+    :param node: The root of the dominate tree.
+    :return: The virtual nodes the root renders to.
+    """
+    nodes: List[VNode] = []
+    _append_node(nodes, node)
+    return nodes
+
+
+def _append_node(nodes: List[VNode], node: dom_tag | str) -> None:
+    if isinstance(node, str):
+        _append_text(nodes, node)
+    elif isinstance(node, text):
+        if node.escape:
+            _append_text(nodes, node.text)
+        else:
+            nodes.append(VRaw(node.text))
+    elif isinstance(node, container):
+        for child in node.children:
+            _append_node(nodes, child)
+    elif isinstance(node, html_tag) and type(node)._render is dom_tag._render:
+        nodes.append(_to_virtual_element(node))
+    else:
+        # Comments, documents and other tags with a custom render implementation are rendered as is
+        nodes.append(VRaw(node.render(pretty=False)))
+
+
+def _append_text(nodes: List[VNode], value: str) -> None:
+    if nodes and isinstance(nodes[-1], VText):
+        nodes[-1] = VText(nodes[-1].html + value)
+    else:
+        nodes.append(VText(value))
+
+
+def _to_virtual_element(node: dom_tag) -> VElement:
+    tag = getattr(node, "tagname", type(node).__name__)
+    if tag[-1] == "_":
+        tag = tag[:-1]
+
+    attributes = {}
+    # Same ordering and filtering as dominate, so that the rendered html is identical
+    for name, value in sorted(node.attributes.items()):
+        if value in (False, None):
+            continue
+        attributes[name] = str(value)
+
+    # The outlet of a memoized dynamic function carries the virtual nodes of its unchanged content
+    children: List[VNode] | None = getattr(node, "virtual_children", None)
+    if children is None:
+        children = []
+        for child in node.children:
+            _append_node(children, child)
+
+    return VElement(
+        tag=tag,
+        attributes=attributes,
+        children=children,
+        is_single=node.is_single,
+        is_opaque=not node.is_pretty or any(isinstance(child, VRaw) for child in children),
+    )
+
+
+def render_virtual_dom(nodes: List[VNode]) -> str:
+    return "".join(node.render() for node in nodes)
+
+
+def render_current_content(nodes: List[VNode], previous_render: Callable[[str], List[VNode] | None]) -> str:
+    """
+    Render the content of an outlet with the current content of the nested dynamic functions, which may have been
+    re-rendered on their own since the outlet was rendered.
+    :param previous_render: Returns the current content of a nested dynamic function outlet, or None if unknown.
+    """
+    rendered = []
+    for node in nodes:
+        if not isinstance(node, VElement) or node.is_single:
+            rendered.append(node.render())
+            continue
+        children = node.children
+        if node.boundary_id is not None and not node.is_lazy:
+            previous = previous_render(node.boundary_id)
+            if previous is not None:
+                children = previous
+        rendered.append(f"{node.render_start_tag()}{render_current_content(children, previous_render)}</{node.tag}>")
+    return "".join(rendered)
+
+
+def iter_boundaries(nodes: List[VNode]) -> Iterator[Tuple[str, List[VNode]]]:
+    """
+    Iterate over the outlets of all (already rendered) dynamic functions which are part of the tree.
+    :return: Tuples of the id of the dynamic function and the content of its outlet.
+    """
+    for node in nodes:
+        if not isinstance(node, VElement):
+            continue
+        boundary_id = node.boundary_id
+        if boundary_id is not None and not node.is_lazy:
+            yield boundary_id, node.children
+        yield from iter_boundaries(node.children)
+
+
+class _Differ:
+    def __init__(self, previous_render: Callable[[str], List[VNode] | None]):
+        self._previous_render = previous_render
+        self.patches: List[Patch] = []
+
+    def diff_children(self, path: Path, old: List[VNode], new: List[VNode]) -> None:
+        old = [node for node in old if node.is_significant]
+        new = [node for node in new if node.is_significant]
+        shortest = min(len(old), len(new))
+
+        # Skip the unchanged prefix and suffix, so that insertions and deletions in the middle do not cascade into
+        # patches for every following sibling. Siblings usually have the same tag (rows of a list, for example), so
+        # their content has to be equal too.
+        prefix = 0
+        while prefix < shortest and old[prefix] == new[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < shortest - prefix and old[-1 - suffix] == new[-1 - suffix]:
+            suffix += 1
+
+        for index in range(prefix):
+            self.diff_node([*path, index], old[index], new[index])
+        # Indices of the suffix are the ones before the middle part changes
+        for offset in range(1, suffix + 1):
+            self.diff_node([*path, len(old) - offset], old[-offset], new[-offset])
+
+        old_middle = old[prefix : len(old) - suffix]
+        new_middle = new[prefix : len(new) - suffix]
+        for index, (old_node, new_node) in enumerate(zip(old_middle, new_middle)):
+            self.diff_node([*path, prefix + index], old_node, new_node)
+
+        if len(new_middle) > len(old_middle):
+            self.patches.append(
+                PatchInsertChild(
+                    op="insert-child",
+                    path=path,
+                    index=prefix + len(old_middle),
+                    html=render_virtual_dom(new_middle[len(old_middle) :]),
+                )
+            )
+        elif len(old_middle) > len(new_middle):
+            self.patches.append(
+                PatchRemoveChild(
+                    op="remove-child",
+                    path=path,
+                    index=prefix + len(new_middle),
+                    count=len(old_middle) - len(new_middle),
+                )
+            )
+
+    def diff_node(self, path: Path, old: VNode, new: VNode) -> None:
+        if isinstance(old, VText) and isinstance(new, VText):
+            if old.html != new.html:
+                self.patches.append(PatchReplaceText(op="replace-text", path=path, text=html.unescape(new.html)))
+            return
+
+        if not isinstance(old, VElement) or not isinstance(new, VElement) or not _is_similar(old, new):
+            self.patches.append(PatchReplace(op="replace", path=path, html=new.render()))
+            return
+
+        boundary_id = new.boundary_id
+        if boundary_id is not None and new.is_lazy:
+            # The lazy dynamic function manages its own content
+            return
+
+        self.diff_attributes(path, old.attributes, new.attributes)
+
+        old_children = old.children
+        if boundary_id is not None:
+            # The dynamic function may have been re-rendered on its own since the parent was rendered
+            previous = self._previous_render(boundary_id)
+            if previous is not None:
+                old_children = previous
+
+        if old_children is new.children:
+            # Content of a memoized dynamic function, which was not rendered again
+            return
+
+        if old.is_opaque or new.is_opaque:
+            new_html = new.render_children()
+            if render_virtual_dom(old_children) != new_html:
+                self.patches.append(PatchSetHtml(op="set-html", path=path, html=new_html))
+            return
+
+        self.diff_children(path, old_children, new.children)
+
+    def diff_attributes(self, path: Path, old: Dict[str, str], new: Dict[str, str]) -> None:
+        for name, value in new.items():
+            if old.get(name) != value:
+                self.patches.append(PatchSetAttribute(op="set-attr", path=path, name=name, value=value))
+        for name in old:
+            if name not in new:
+                self.patches.append(PatchRemoveAttribute(op="remove-attr", path=path, name=name))
+
+
+def _is_similar(old: VNode, new: VNode) -> bool:
+    if isinstance(old, VElement) and isinstance(new, VElement):
+        return old.tag == new.tag and old.boundary_id == new.boundary_id
+    return type(old) is type(new) and not isinstance(old, VRaw)
+
+
+def diff_virtual_dom(
+    old: List[VNode],
+    new: List[VNode],
+    previous_render: Callable[[str], List[VNode] | None],
+) -> List[Patch]:
+    """
+    Compute the patches which transform the old content of an outlet into the new content.
+    Paths are relative to the outlet and only count nodes which are significant (elements, raw html and text
+    which is not whitespace only).
+    :param old: The content of the outlet the client currently displays.
+    :param new: The new content of the outlet.
+    :param previous_render: Returns the current content of a nested dynamic function outlet, or None if unknown.
+    :return: The patches, which have to be applied in order.
+    """
+    differ = _Differ(previous_render)
+    if any(isinstance(node, VRaw) for node in [*old, *new]):
+        new_html = render_virtual_dom(new)
+        if render_virtual_dom(old) != new_html:
+            differ.patches.append(PatchSetHtml(op="set-html", path=[], html=new_html))
+    else:
+        differ.diff_children([], old, new)
+    return differ.patches
@@ -1,11 +1,40 @@
-from typing import Callable, Any, Dict, Set, List
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass
+from typing import Callable, Any, Dict, Set, List, Iterator, Hashable, Tuple, Awaitable
 
+from .dom_patch import VNode
+from .messages import ResponseBinding
 from .._local_storage import local_storage
 from .._types import RenderFunction, RenderResult
-from ..reactive import Value
+from ..reactive import Value, ValueSubscription
 
 DynamicFunctionId = str
-LineNr = int
+# The offset of the instruction in the dynamic function which created a value
+CallSite = int
+BindingId = str
+# A nested dynamic function is identified by the decorated function and either its explicit key or its position
+ChildKey = Tuple[int, bool, Hashable]
+
+
+@dataclass
+class Binding:
+    value: Value
+    # The attribute the value is bound to, None if the value is bound to the text of the element
+    attribute: str | None
+    transform: Callable[[Any], Any]
+
+    def render(self) -> str | None:
+        # noinspection PyProtectedMember
+        value = self.transform(self.value._read())
+        if self.attribute is not None:
+            # Same handling of boolean attributes as in dominate
+            if value is False or value is None:
+                return None
+            if value is True:
+                return self.attribute
+        return str(value)
 
 
 class DynamicFunction:
@@ -15,7 +44,8 @@ class DynamicFunction:
         dynamic_function_id: DynamicFunctionId,
         args: tuple,
         kwargs: dict,
-            name: str
+            name: str,
+            parent_id: DynamicFunctionId | None = None,
     ):
         # Function arguments
         self._args = args
@@ -23,17 +53,53 @@ class DynamicFunction:
         self._func = func
         self._dynamic_function_id = dynamic_function_id
         self._name = name
+        # The dynamic function this function was called in, None for dynamic functions called directly by a page
+        self.parent_id = parent_id
 
         # Lifecycle hooks
         self._on_mount: List[Callable[[], Callable[[], Any] | None]] = []
         self._on_unmount: List[Callable[[], Any]] = []
         self._first_call = True
         self._on_event_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._event_handler_counter = 0
+
+        # Bindings of values to the text or attributes of elements, which are updated without a re-render
+        self._bindings: Dict[BindingId, Binding] = {}
+        # The event handlers and bindings of the render which is in progress. They replace the ones of the last render
+        # once it is finished, that way the client can still call the displayed handlers while an async render runs.
+        self._rendered_event_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._rendered_bindings: Dict[BindingId, Binding] = {}
+        self._values_to_update_bindings_for: Dict[Value, ValueSubscription] = {}
 
         # Stable values
-        self._values: Dict[LineNr, Value] = {}
-        self._stable_values: Dict[LineNr, Value] = {}
-        self._values_to_listen_for_changes: Set[Value] = set()
+        self._values: Dict[CallSite, Value] = {}
+        self._stable_values: Dict[CallSite, Value] = {}
+        self._values_to_listen_for_changes: Dict[Value, ValueSubscription] = {}
+
+        # Nested dynamic functions of the last render and the ones of the render which is in progress
+        self._children: Dict[ChildKey, DynamicFunctionId] = {}
+        self._rendered_children: Dict[ChildKey, DynamicFunctionId] = {}
+        self._child_positions: Dict[int, int] = {}
+
+        # The content of the outlet as it is currently displayed by the client. None if the client content is unknown
+        self.last_render: List[VNode] | None = None
+        # The result of the last call and whether a value it depends on changed since
+        self._last_result: RenderResult | None = None
+        self._stale = True
+        # Whether the client displays the result of the last call. It does not if the render of the parent the
+        # function was called in was dropped, for example.
+        self.displays_last_result = False
+        # Incremented whenever a value the function depends on changes. A render which started with an older
+        # generation is superseded by the render which is scheduled for the change.
+        self.generation = 0
+        self._render_generation = 0
+        self._render_started = 0.0
+        # When the first render was dropped which was superseded since the last committed one
+        self._waiting_since: float | None = None
+
+        # Running async renders and event handlers. A new async render supersedes the running one.
+        self._tasks: Set[asyncio.Task] = set()
+        self.render_task: asyncio.Task | None = None
 
         # Local storage
         self._local_storage = local_storage()
@@ -43,34 +109,209 @@ class DynamicFunction:
         return self._name
 
     def __call__(self) -> RenderResult:
-        self._on_event_handlers.clear()
-        result = self._func(*self._args, **self._kwargs)
+        result = self.render()
+        self.commit_render(result)
+        return result
+
+    def render(self) -> RenderResult:
+        """
+        Call the function. The result still has to be committed with commit_render, which replaces the children, event
+        handlers and bindings of the last render with the ones of this render.
+        """
+        self._start_render()
+        try:
+            return self._func(*self._args, **self._kwargs)
+        except BaseException:
+            self.abort_render()
+            raise
+
+    async def render_async(self) -> RenderResult:
+        """
+        Call a dynamic function which is defined with async def. The result still has to be committed with
+        commit_render.
+        """
+        self._start_render()
+        try:
+            return await self._func(*self._args, **self._kwargs)
+        except BaseException:
+            # Cancelled renders end up here as well
+            self.abort_render()
+            raise
+
+    def commit_render(self, result: RenderResult, supersedable: bool = False) -> bool:
+        """
+        :param supersedable: Abort the render instead, if it is superseded by a render which is scheduled already.
+        :return: False if the render was aborted.
+        """
+        if supersedable and self._is_superseded():
+            self.abort_render()
+            return False
+        self._finish_render(result)
+        return True
+
+    @property
+    def is_async(self) -> bool:
+        return inspect.iscoroutinefunction(self._func)
+
+    def _start_render(self) -> None:
+        self._rendered_event_handlers = {}
+        self._event_handler_counter = 0
+        self._rendered_bindings = {}
+        self._rendered_children = {}
+        self._child_positions = {}
+        self._stale = False
+        self._render_generation = self.generation
+        self._render_started = time.monotonic()
+
+    def _is_superseded(self) -> bool:
+        """
+        A value the function depends on changed during the render, so the result is already outdated and the render
+        which is scheduled for the change sends the content instead. Values which change faster than the function
+        renders would hold back the content forever, so an outdated result is still committed once the client has
+        waited for new content for longer than two renders of the function take.
+        """
+        if self.generation == self._render_generation:
+            return False
+        now = time.monotonic()
+        if self._waiting_since is None:
+            self._waiting_since = self._render_started
+        return now - self._waiting_since < 2 * (now - self._render_started)
+
+    def abort_render(self) -> None:
+        # Keep the children of the failed render as well, so they can still be cleaned up
+        self._children.update(self._rendered_children)
+        self._rendered_event_handlers = {}
+        self._rendered_bindings = {}
+
+    def _finish_render(self, result: RenderResult) -> None:
+        # Unmount the children which were not rendered again
+        removed = [child_id for key, child_id in self._children.items() if key not in self._rendered_children]
+        self._children = self._rendered_children
+        self._on_event_handlers = self._rendered_event_handlers
+        self._bindings = self._rendered_bindings
+        self._rendered_event_handlers = {}
+        self._rendered_bindings = {}
+        self._last_result = result
+        self.displays_last_result = False
+        self._waiting_since = None
+        session = self._local_storage.active_session()
+        for child_id in removed:
+            session.remove_dynamic_function(child_id)
+
         if self._first_call:
             for fn in self._on_mount:
                 on_destroy = fn()
                 if on_destroy is not None:
                     self._on_unmount.append(on_destroy)
         self._first_call = False
-        return result
+
+    def add_task(self, task: asyncio.Task) -> None:
+        """
+        Keep track of a task which belongs to the dynamic function (async renders and event handlers), so it is
+        cancelled when the dynamic function is unmounted.
+        """
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
 
     @property
     def is_first_call(self) -> bool:
         return self._first_call
 
+    @property
+    def child_ids(self) -> List[DynamicFunctionId]:
+        return list(self._children.values())
+
+    def invalidate(self) -> None:
+        self._stale = True
+        self.generation += 1
+
+    def discard_memoized_result(self) -> None:
+        """
+        A nested dynamic function was rendered on its own, so the result of the last call contains its old content.
+        """
+        self._stale = True
+
+    def memoized_result(
+        self, args: tuple, kwargs: dict, args_equal: Callable[[Any, Any], bool]
+    ) -> RenderResult | None:
+        """
+        The result of the last call, if it is still valid for the given arguments.
+        :param args_equal: Compares an argument of the last call with the one of this call.
+        :return: The result of the last call or None if the function has to be called again.
+        """
+        if self._stale or not self.displays_last_result or self._last_result is None:
+            return None
+        if not self.arguments_equal(args, kwargs, args_equal):
+            return None
+        return self._last_result
+
+    def arguments_equal(self, args: tuple, kwargs: dict, args_equal: Callable[[Any, Any], bool]) -> bool:
+        """
+        :param args_equal: Compares an argument of the last call with the one of this call.
+        :return: True if the function was last called with the same arguments.
+        """
+        if len(args) != len(self._args) or kwargs.keys() != self._kwargs.keys():
+            return False
+        if not all(args_equal(old, new) for old, new in zip(self._args, args)):
+            return False
+        return all(args_equal(self._kwargs[name], value) for name, value in kwargs.items())
+
+    def update_arguments(self, args: tuple, kwargs: dict) -> None:
+        self._args = args
+        self._kwargs = kwargs
+
+    def find_child(self, fn_id: int, key: Hashable | None) -> Tuple[ChildKey, DynamicFunctionId | None]:
+        """
+        Find the nested dynamic function which was rendered for the same function and key (or position, if no key
+        is given) in the last render.
+        :return: The key of the child and its id, or None if the child has to be created.
+        """
+        if key is None:
+            position = self._child_positions.get(fn_id, 0)
+            self._child_positions[fn_id] = position + 1
+            child_key = (fn_id, False, position)
+        else:
+            child_key = (fn_id, True, key)
+
+        if child_key in self._rendered_children:
+            raise ValueError(f"The key {key} is used for more than one call of the same function in {self._name}")
+        return child_key, self._children.get(child_key)
+
+    def add_child(self, child_key: ChildKey, dynamic_function_id: DynamicFunctionId) -> None:
+        self._rendered_children[child_key] = dynamic_function_id
+
     def destroy(self) -> None:
+        for task in list(self._tasks):
+            # Children are unmounted at the end of the render of their parent, which may run in the executor
+            task.get_loop().call_soon_threadsafe(task.cancel)
+        self.render_task = None
+
         for fn in self._on_unmount:
             fn()
 
         for value in self._values.values():
             value.destroy()
 
+        # Values which do not belong to this function (passed as arguments, for example) outlive it
+        subscriptions = [*self._values_to_listen_for_changes.values(), *self._values_to_update_bindings_for.values()]
+        for subscription in subscriptions:
+            subscription.unsubscribe()
+
         # Clear all dicts/lists/sets
         self._on_mount.clear()
         self._on_unmount.clear()
         self._values.clear()
         self._stable_values.clear()
         self._values_to_listen_for_changes.clear()
+        self._values_to_update_bindings_for.clear()
         self._on_event_handlers.clear()
+        self._bindings.clear()
+        self._rendered_event_handlers.clear()
+        self._rendered_bindings.clear()
+        self._children.clear()
+        self._rendered_children.clear()
+        self.last_render = None
+        self._last_result = None
 
     def on_mount(self, fn: Callable[[], Callable[[], Any] | None]) -> None:
         self._on_mount.append(fn)
@@ -78,36 +319,65 @@ class DynamicFunction:
     def on_unmount(self, fn: Callable[[], Any]) -> None:
         self._on_unmount.append(fn)
 
-    def add_value(self, call_line: LineNr, value: Value) -> None:
-        self._values[call_line] = value
+    def add_value(self, call_site: CallSite, value: Value) -> None:
+        self._values[call_site] = value
 
-    def has_value(self, call_line: LineNr) -> bool:
-        return call_line in self._values
+    def get_value(self, call_site: CallSite) -> Value | None:
+        return self._values.get(call_site)
 
-    def get_value(self, call_line: LineNr) -> Value:
-        return self._values[call_line]
+    def add_stable_value(self, call_site: CallSite, value: Value) -> None:
+        self._stable_values[call_site] = value
 
-    def add_stable_value(self, call_line: LineNr, value: Value) -> None:
-        self._stable_values[call_line] = value
+    def get_stable_value(self, call_site: CallSite) -> Value | None:
+        return self._stable_values.get(call_site)
 
-    def has_stable_value(self, call_line: LineNr) -> bool:
-        return call_line in self._stable_values
-
-    def get_stable_value(self, call_line: LineNr) -> Value:
-        return self._stable_values[call_line]
+    def is_listening_for_changes(self, value: Value) -> bool:
+        return value in self._values_to_listen_for_changes
 
     def listen_for_changes(self, value: Value, invoke_rerender: Callable[[Value], None]) -> None:
         if value in self._values_to_listen_for_changes:
             return
 
-        value.on_update(invoke_rerender)
-        self._values_to_listen_for_changes.add(value)
+        self._values_to_listen_for_changes[value] = value.on_update(invoke_rerender)
+
+    def listen_for_binding_changes(self, value: Value, invoke_update: Callable[[Value], None]) -> None:
+        if value in self._values_to_update_bindings_for:
+            return
+
+        self._values_to_update_bindings_for[value] = value.on_update(invoke_update)
+
+    def register_binding(self, value: Value, attribute: str | None, transform: Callable[[Any], Any]) -> BindingId:
+        """
+        Bindings are numbered in the order they are registered during a render, the same way event handlers are.
+        """
+        binding_id = f"{self._dynamic_function_id}-{len(self._rendered_bindings)}"
+        self._rendered_bindings[binding_id] = Binding(value=value, attribute=attribute, transform=transform)
+        return binding_id
+
+    def binding_messages(self, values: Set[Value]) -> Iterator[ResponseBinding]:
+        for binding_id, binding in self._bindings.items():
+            if binding.value in values:
+                yield ResponseBinding(
+                    type="binding@response", id=binding_id, attribute=binding.attribute, value=binding.render()
+                )
+
+    def create_event_handler_id(self, event: str) -> str:
+        """
+        Event handler ids are numbered in the order they are registered during a render. That way an unchanged
+        element keeps its id across re-renders and does not have to be patched on the client.
+        """
+        event_handler_id = f"{event}-{self._event_handler_counter}"
+        self._event_handler_counter += 1
+        return event_handler_id
 
     def register_event_handler(self, event_handler_id: str, handler: Callable[[Any, Any], None], data):
-        self._on_event_handlers[event_handler_id] = lambda event: handler(event, data)
+        self._rendered_event_handlers[event_handler_id] = lambda event: handler(event, data)
 
-    def call_event(self, event_handler_id: str, event: Any):
+    def call_event(self, event_handler_id: str, event: Any) -> Awaitable[None] | None:
+        """
+        :return: The awaitable of an async event handler, which still has to be awaited.
+        """
         if event_handler_id not in self._on_event_handlers:
             raise ValueError(f"Event handler with id {event_handler_id} does not exist")
 
-        self._on_event_handlers[event_handler_id](event)
+        return self._on_event_handlers[event_handler_id](event)
@@ -1,4 +1,4 @@
-from typing import Literal, Union, Dict, Any
+from typing import Literal, Union, Dict, Any, List
 
 from pydantic import BaseModel, RootModel
 
@@ -28,12 +28,83 @@ class ResponseReRender(BaseModel):
     html: str
 
 
+class PatchSetAttribute(BaseModel):
+    op: Literal["set-attr"]
+    path: List[int]
+    name: str
+    value: str
+
+
+class PatchRemoveAttribute(BaseModel):
+    op: Literal["remove-attr"]
+    path: List[int]
+    name: str
+
+
+class PatchReplaceText(BaseModel):
+    op: Literal["replace-text"]
+    path: List[int]
+    text: str
+
+
+class PatchReplace(BaseModel):
+    op: Literal["replace"]
+    path: List[int]
+    html: str
+
+
+class PatchSetHtml(BaseModel):
+    op: Literal["set-html"]
+    path: List[int]
+    html: str
+
+
+class PatchInsertChild(BaseModel):
+    op: Literal["insert-child"]
+    path: List[int]
+    index: int
+    html: str
+
+
+class PatchRemoveChild(BaseModel):
+    op: Literal["remove-child"]
+    path: List[int]
+    index: int
+    count: int
+
+
+Patch = Union[
+    PatchSetAttribute,
+    PatchRemoveAttribute,
+    PatchReplaceText,
+    PatchReplace,
+    PatchSetHtml,
+    PatchInsertChild,
+    PatchRemoveChild,
+]
+
+
+class ResponsePatch(BaseModel):
+    type: Literal["patch@response"]
+    id: str
+    patches: List[Patch]
+
+
+class ResponseBinding(BaseModel):
+    type: Literal["binding@response"]
+    id: str
+    # None for text bindings
+    attribute: str | None
+    # None removes the attribute
+    value: str | None
+
+
 class ResponseError(BaseModel):
     type: Literal["error@response"]
     error: str
 
 
-BetterShinyResponsesType = Union[ResponseReRender, ResponseError]
+BetterShinyResponsesType = Union[ResponseReRender, ResponsePatch, ResponseBinding, ResponseError]
 
 
 class BetterShinyResponses(RootModel):
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Set, TYPE_CHECKING
+
+from .dynamic_function import DynamicFunctionId
+from .._local_storage import local_storage
+from ..utils import create_logger
+
+if TYPE_CHECKING:
+    from .session import Session
+    from ..reactive import Value
+
+logger = create_logger(__name__)
+
+
+class RenderScheduler:
+    """
+    Collects the dynamic functions of a session which have to be re-rendered and renders them once per frame.
+    Marking a dynamic function as dirty multiple times before the next frame results in a single render.
+    """
+
+    def __init__(self, session: "Session", max_frame_rate: float | None = None):
+        self._session = session
+        self.max_frame_rate = max_frame_rate
+        self._dirty: Set[DynamicFunctionId] = set()
+        self._dirty_bindings: Dict[DynamicFunctionId, Set["Value"]] = {}
+        self._flush_handle: asyncio.Handle | None = None
+        self._frame: asyncio.Task | None = None
+        self._last_flush = 0.0
+        self._local_storage = local_storage()
+
+    def mark_dirty(self, dynamic_function_id: DynamicFunctionId) -> None:
+        if self._call_in_event_loop(self.mark_dirty, dynamic_function_id):
+            return
+        self._dirty.add(dynamic_function_id)
+        self.schedule()
+
+    def mark_bindings_dirty(self, dynamic_function_id: DynamicFunctionId, value: "Value") -> None:
+        if self._call_in_event_loop(self.mark_bindings_dirty, dynamic_function_id, value):
+            return
+        self._dirty_bindings.setdefault(dynamic_function_id, set()).add(value)
+        self.schedule()
+
+    def schedule(self) -> None:
+        """
+        Schedule the next frame, if there is something to render and no frame is scheduled or rendering yet.
+        """
+        if self._flush_handle is not None or self._frame is not None or not (self._dirty or self._dirty_bindings):
+            return
+
+        if self._session.websocket is None:
+            # No connection established (yet) -> the frame is scheduled once the websocket connects
+            return
+
+        loop = self._local_storage.app.event_loop
+        delay = 0.0
+        if self.max_frame_rate:
+            delay = max(0.0, self._last_flush + 1 / self.max_frame_rate - time.monotonic())
+        if delay > 0:
+            self._flush_handle = loop.call_later(delay, self._flush)
+        else:
+            self._flush_handle = loop.call_soon(self._flush)
+
+    def _call_in_event_loop(self, fn: Callable[..., None], *args: Any) -> bool:
+        """
+        Values can be changed by dynamic functions and event handlers which run in the executor of the app, the
+        scheduler itself is only used from the event loop.
+        :return: True if the call was passed on to the event loop.
+        """
+        app = self._local_storage.app
+        if app.event_loop is None or threading.current_thread() is app.event_loop_thread:
+            return False
+        app.event_loop.call_soon_threadsafe(fn, *args)
+        return True
+
+    def cancel(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._frame is not None:
+            self._frame.cancel()
+            self._frame = None
+        self._dirty.clear()
+        self._dirty_bindings.clear()
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        self._last_flush = time.monotonic()
+        self._frame = self._local_storage.app.event_loop.create_task(self._render_frame())
+
+    async def _render_frame(self) -> None:
+        try:
+            await self._render_dirty()
+        finally:
+            self._frame = None
+        # Render everything that changed while the frame was rendered
+        self.schedule()
+
+    async def _render_dirty(self) -> None:
+        if not self._session.is_active:
+            # Websocket has closed and the session will be cleaned up soon
+            self._dirty.clear()
+            self._dirty_bindings.clear()
+            return
+
+        # Bindings are updated first, that way the client displays the latest values the patches are computed against
+        dirty_bindings = self._dirty_bindings
+        self._dirty_bindings = {}
+        for dynamic_function_id, values in dirty_bindings.items():
+            if not self._session.has_dynamic_function(dynamic_function_id):
+                continue
+            try:
+                # noinspection PyProtectedMember
+                self._local_storage.app._update_bindings(
+                    session_id=self._session.session_id,
+                    dynamic_function_id=dynamic_function_id,
+                    values=values,
+                    websocket=self._session.websocket,
+                )
+            except Exception as e:
+                logger.error(f"Error while updating the bindings of {dynamic_function_id}:")
+                logger.exception(e)
+
+        # Render parents before their children. A child which is rendered as part of its parent is not rendered again.
+        dirty = sorted(self._dirty, key=self._session.depth)
+        self._dirty.clear()
+        rendered: Set[DynamicFunctionId] = set()
+        for dynamic_function_id in dirty:
+            if not self._session.has_dynamic_function(dynamic_function_id):
+                continue
+            if any(ancestor in rendered for ancestor in self._session.ancestors(dynamic_function_id)):
+                continue
+
+            try:
+                # noinspection PyProtectedMember
+                await self._local_storage.app._rerender_component(
+                    session_id=self._session.session_id,
+                    dynamic_function_id=dynamic_function_id,
+                    websocket=self._session.websocket,
+                )
+            except Exception as e:
+                logger.error(f"Error while re-rendering {dynamic_function_id}:")
+                logger.exception(e)
+            rendered.add(dynamic_function_id)
@@ -1,9 +1,12 @@
+import asyncio
 import time
-from typing import Dict, List, Callable
+from typing import Dict, List, Iterator
 
 from starlette.websockets import WebSocket, WebSocketState
 
+from .dom_patch import VNode, iter_boundaries, render_current_content
 from .dynamic_function import DynamicFunctionId, DynamicFunction
+from .render_scheduler import RenderScheduler
 from .._local_storage import local_storage
 from .._types import RenderFunction
 from ..reactive import Value
@@ -12,13 +15,32 @@ SessionId = str
 
 
 class Session:
-    def __init__(self, session_id: SessionId):
+    def __init__(self, session_id: SessionId, max_frame_rate: float | None = None):
         self.session_id: SessionId = session_id
         self.websocket: WebSocket | None = None
         self._dynamic_functions: Dict[DynamicFunctionId, DynamicFunction] = {}
         self._local_storage = local_storage()
         self._startup_time = time.time()
-        self._delayed_executions: List[Callable[[], None]] = []
+        self._render_scheduler = RenderScheduler(self, max_frame_rate)
+        # Held while a dynamic function or event handler of the session runs, they may run in different threads
+        self.render_lock = asyncio.Lock()
+
+    @property
+    def max_frame_rate(self) -> float | None:
+        """
+        The maximal number of times per second the dynamic functions of this session are re-rendered.
+        None means that dynamic functions are re-rendered in the next iteration of the event loop.
+        """
+        return self._render_scheduler.max_frame_rate
+
+    @max_frame_rate.setter
+    def max_frame_rate(self, value: float | None) -> None:
+        self._render_scheduler.max_frame_rate = value
+
+    def connect(self, websocket: WebSocket) -> None:
+        self.websocket = websocket
+        # Render everything that changed while the websocket was not connected yet
+        self._render_scheduler.schedule()
 
     @property
     def is_active(self) -> bool:
@@ -33,6 +55,7 @@ class Session:
         )
 
     def destroy(self) -> None:
+        self._render_scheduler.cancel()
         for instance in self._dynamic_functions.values():
             instance.destroy()
 
@@ -42,13 +65,73 @@ class Session:
 
         return self._dynamic_functions[dynamic_function_id]
 
+    def remove_dynamic_function(self, dynamic_function_id: DynamicFunctionId) -> None:
+        """
+        Unmount the dynamic function and all dynamic functions nested in it.
+        """
+        dynamic_function = self._dynamic_functions.pop(dynamic_function_id, None)
+        if dynamic_function is None:
+            return
+
+        for child_id in dynamic_function.child_ids:
+            self.remove_dynamic_function(child_id)
+        dynamic_function.destroy()
+
+    def has_dynamic_function(self, dynamic_function_id: DynamicFunctionId) -> bool:
+        return dynamic_function_id in self._dynamic_functions
+
+    def ancestors(self, dynamic_function_id: DynamicFunctionId) -> Iterator[DynamicFunctionId]:
+        parent_id = self._dynamic_functions[dynamic_function_id].parent_id
+        while parent_id is not None and parent_id in self._dynamic_functions:
+            yield parent_id
+            parent_id = self._dynamic_functions[parent_id].parent_id
+
+    def depth(self, dynamic_function_id: DynamicFunctionId) -> int:
+        if dynamic_function_id not in self._dynamic_functions:
+            return 0
+        return sum(1 for _ in self.ancestors(dynamic_function_id))
+
+    def previous_render(self, dynamic_function_id: DynamicFunctionId) -> List[VNode] | None:
+        """
+        The content of the outlet of the dynamic function as it is currently displayed by the client.
+        """
+        if dynamic_function_id not in self._dynamic_functions:
+            return None
+        return self._dynamic_functions[dynamic_function_id].last_render
+
+    def current_html(self, dynamic_function_id: DynamicFunctionId) -> str | None:
+        """
+        The html of the outlet of the dynamic function as the client displays it once it received every message which
+        was created so far. None if the content is unknown.
+        """
+        nodes = self.previous_render(dynamic_function_id)
+        if nodes is None:
+            return None
+        return render_current_content(nodes, self.previous_render)
+
+    def remember_render(self, dynamic_function_id: DynamicFunctionId | None, nodes: List[VNode]) -> None:
+        """
+        Store the content which was sent to the client for the dynamic function and all dynamic functions nested in it.
+        :param dynamic_function_id: None if the nodes are the content of a page.
+        """
+        for boundary_id, children in [(dynamic_function_id, nodes), *iter_boundaries(nodes)]:
+            if boundary_id is not None and boundary_id in self._dynamic_functions:
+                self._dynamic_functions[boundary_id].last_render = children
+                self._dynamic_functions[boundary_id].displays_last_result = True
+
+        if dynamic_function_id is not None and dynamic_function_id in self._dynamic_functions:
+            # The memoized results of the ancestors still contain the old content of the dynamic function
+            for ancestor_id in self.ancestors(dynamic_function_id):
+                self._dynamic_functions[ancestor_id].discard_memoized_result()
+
     def create_dynamic_function(
         self,
         dynamic_function_id: DynamicFunctionId,
         args: tuple,
         kwargs: dict,
         func: RenderFunction,
-            name: str
+            name: str,
+            parent_id: DynamicFunctionId | None = None,
     ) -> None:
         if dynamic_function_id in self._dynamic_functions:
             raise ValueError(
@@ -56,33 +139,36 @@ class Session:
             )
 
         self._dynamic_functions[dynamic_function_id] = DynamicFunction(
-            args=args, kwargs=kwargs, dynamic_function_id=dynamic_function_id, func=func, name=name
+            args=args,
+            kwargs=kwargs,
+            dynamic_function_id=dynamic_function_id,
+            func=func,
+            name=name,
+            parent_id=parent_id,
         )
 
     def rerender_on_change(self, dynamic_function_id: DynamicFunctionId, value: Value) -> None:
-        app = self._local_storage.app
-
-        def invoke_rerender(inner_value: Value, skip_delayed_executions: bool = False) -> None:
-            if not self.is_active:
-                # Websocket has closed and the session will be cleaned up soon
-                return
-
-            if self.websocket is None:
-                # No connection established (yet) -> waits for a websocket connection to be established
-                self._delayed_executions.append(lambda: invoke_rerender(inner_value, skip_delayed_executions=True))
-                return
-
-            if len(self._delayed_executions) > 0 and not skip_delayed_executions:
-                for delayed_execution in self._delayed_executions:
-                    delayed_execution()
-                self._delayed_executions.clear()
-
-            # noinspection PyProtectedMember
-            app._rerender_component(
-                session_id=self.session_id,
-                dynamic_function_id=dynamic_function_id,
-                websocket=self.websocket,
-            )
-
         dynamic_function = self.get_dynamic_function(dynamic_function_id)
+        if dynamic_function.is_listening_for_changes(value):
+            return
+
+        def invoke_rerender(inner_value: Value) -> None:
+            dynamic_function.invalidate()
+            # The render itself happens in the next frame, so multiple changes result in a single render
+            self._render_scheduler.mark_dirty(dynamic_function_id)
+
         dynamic_function.listen_for_changes(value, invoke_rerender)
+
+    def request_render(self, dynamic_function_id: DynamicFunctionId) -> None:
+        """
+        Render the dynamic function in the next frame.
+        """
+        self._render_scheduler.mark_dirty(dynamic_function_id)
+
+    def update_bindings_on_change(self, dynamic_function_id: DynamicFunctionId, value: Value) -> None:
+        def invoke_update(inner_value: Value) -> None:
+            # Only the bound text and attributes are sent in the next frame, the dynamic function is not called
+            self._render_scheduler.mark_bindings_dirty(dynamic_function_id, inner_value)
+
+        dynamic_function = self.get_dynamic_function(dynamic_function_id)
+        dynamic_function.listen_for_binding_changes(value, invoke_update)
@@ -7,8 +7,9 @@ from ..utils import set_interval
 
 
 class SessionCollector:
-    def __init__(self):
+    def __init__(self, max_frame_rate: float | None = None):
         self._sessions: Dict[SessionId, Session] = {}
+        self._max_frame_rate = max_frame_rate
 
     def start(self) -> None:
         set_interval(self._remove_unused_sessions, 60)
@@ -24,6 +25,7 @@ class SessionCollector:
 
         self._sessions[session_id] = Session(
             session_id=session_id,
+            max_frame_rate=self._max_frame_rate,
         )
         return self._sessions[session_id]
 
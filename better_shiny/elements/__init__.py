@@ -1,4 +1,36 @@
-from .dataframe import pandas_element
-from .dict import dict_element
-from .matplot import matplot_element
-from .table import table_element
\ No newline at end of file
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from .dataframe import pandas_element
+    from .dict import dict_element
+    from .matplot import matplot_element, matplot_element_async, configure_plot_cache, configure_plot_pool
+    from .table import table_element
+
+# The elements are imported when they are first accessed, that way pandas and matplotlib are only imported by apps
+# which use them
+_lazy_attributes = {
+    "pandas_element": ".dataframe",
+    "dict_element": ".dict",
+    "matplot_element": ".matplot",
+    "matplot_element_async": ".matplot",
+    "configure_plot_cache": ".matplot",
+    "configure_plot_pool": ".matplot",
+    "table_element": ".table",
+}
+
+__all__ = list(_lazy_attributes)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _lazy_attributes:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_lazy_attributes[name], __name__), name)
+    # Later accesses find the attribute in the module and do not call __getattr__ again
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted({*globals(), *_lazy_attributes})
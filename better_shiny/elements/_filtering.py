@@ -0,0 +1,88 @@
+import operator
+import re
+from typing import Dict, Hashable
+
+from better_shiny.elements._frame_cache import frame_cache
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = None
+    pd = None
+
+_NUMBER = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+# A comparison (e.g. ">= 5") or a range (e.g. "1..10") for numeric columns
+_COMPARISON = re.compile(rf"^(<=|>=|<|>|==|=)?\s*({_NUMBER})$")
+_RANGE = re.compile(rf"^({_NUMBER})\s*\.\.\s*({_NUMBER})$")
+_OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "=": operator.eq,
+    "==": operator.eq,
+    None: operator.eq,
+}
+
+
+def _lowercase_text(df: pd.DataFrame, column: Hashable) -> pd.Series:
+    values = df[column]
+    # Missing values never match
+    return values.astype(str).str.lower().mask(values.isna(), "")
+
+
+def _contains_mask(df: pd.DataFrame, column: Hashable, text: str) -> np.ndarray:
+    strings = frame_cache.get(df, ("text", column), lambda: _lowercase_text(df, column))
+    return strings.str.contains(text.lower(), regex=False).to_numpy(dtype=bool)
+
+
+def _column_mask(df: pd.DataFrame, column: Hashable, text: str) -> np.ndarray:
+    values = df[column]
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        range_match = _RANGE.match(text)
+        if range_match:
+            low, high = float(range_match.group(1)), float(range_match.group(2))
+            return values.between(low, high).to_numpy(dtype=bool)
+        comparison_match = _COMPARISON.match(text)
+        if comparison_match:
+            compare = _OPERATORS[comparison_match.group(1)]
+            return compare(values, float(comparison_match.group(2))).to_numpy(dtype=bool)
+    return _contains_mask(df, column, text)
+
+
+def column_mask(df: pd.DataFrame, column: Hashable, text: str) -> np.ndarray:
+    """
+    The rows whose value in the column matches the filter. Numeric columns can be filtered by comparisons
+    (e.g. ">= 5") and ranges (e.g. "1..10"), every other filter matches the values which contain the text, ignoring
+    the case. The mask of a filter is cached, so it is only computed once for a frame.
+    """
+    text = text.strip()
+    return frame_cache.get(df, ("filter", column, text), lambda: _column_mask(df, column, text))
+
+
+def _search_mask(df: pd.DataFrame, text: str) -> np.ndarray:
+    mask = np.zeros(len(df), dtype=bool)
+    for column in df.columns:
+        mask |= _contains_mask(df, column, text)
+    return mask
+
+
+def search_mask(df: pd.DataFrame, text: str) -> np.ndarray:
+    """
+    The rows which contain the text in any column, ignoring the case.
+    """
+    text = text.strip()
+    return frame_cache.get(df, ("search", text), lambda: _search_mask(df, text))
+
+
+def filter_mask(df: pd.DataFrame, search: str, column_filters: Dict[Hashable, str]) -> np.ndarray | None:
+    """
+    Combine the search and the filters of the columns, None if nothing is filtered.
+    """
+    masks = [column_mask(df, column, text) for column, text in column_filters.items() if text.strip()]
+    if search.strip():
+        masks.append(search_mask(df, search))
+    if not masks:
+        return None
+    return np.logical_and.reduce(masks)
@@ -0,0 +1,56 @@
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple, TypeVar
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+T = TypeVar("T")
+
+
+class FrameCache:
+    """
+    Caches values which are computed from a DataFrame (sort orders, filter masks, ...), so they are only computed once
+    for a frame, even if it is displayed in many sessions.
+    The values of a frame are dropped when the frame is garbage collected, and the least recently used ones once a
+    frame has too many. Frames which are changed in place are not detected, pass a new frame instead.
+    """
+
+    def __init__(self, max_values_per_frame: int):
+        self.max_values_per_frame = max_values_per_frame
+        # The id of a frame, with its columns and number of rows to recognize frames which reuse the id of a collected
+        # frame, and the cached values
+        self._frames: Dict[int, Tuple[Tuple[int, Any], OrderedDict[Hashable, Any]]] = {}
+        # Sessions may be rendered concurrently in the render executor
+        self._lock = threading.Lock()
+
+    def get(self, df: pd.DataFrame, key: Hashable, compute: Callable[[], T]) -> T:
+        """
+        The cached value of the frame, computed if it is not cached yet.
+        """
+        frame_id = id(df)
+        version = (len(df), tuple(df.columns))
+        with self._lock:
+            entry = self._frames.get(frame_id)
+            if entry is None or entry[0] != version:
+                if entry is None:
+                    weakref.finalize(df, self._frames.pop, frame_id, None)
+                entry = (version, OrderedDict())
+                self._frames[frame_id] = entry
+            values = entry[1]
+            if key in values:
+                values.move_to_end(key)
+                return values[key]
+
+        value = compute()
+        with self._lock:
+            values[key] = value
+            while len(values) > self.max_values_per_frame:
+                values.popitem(last=False)
+        return value
+
+
+frame_cache = FrameCache(max_values_per_frame=128)
@@ -0,0 +1,29 @@
+from typing import Hashable, Tuple
+
+from better_shiny.elements._frame_cache import frame_cache
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    np = None
+    pd = None
+
+
+def _ascending_order(df: pd.DataFrame, column: Hashable) -> Tuple[np.ndarray, int]:
+    # Sorted the same way as DataFrame.sort_values, the index is replaced by the positions of the rows
+    values = df[column].set_axis(pd.RangeIndex(len(df)), copy=False)
+    return values.sort_values().index.to_numpy(), int(values.notna().sum())
+
+
+def sorted_positions(df: pd.DataFrame, column: Hashable, ascending: bool) -> np.ndarray:
+    """
+    The positions of the rows of the DataFrame, sorted by the column. Missing values are always last, the same as in
+    DataFrame.sort_values. The ascending order of a column is cached, so toggling the sorting of a table only selects
+    the rows of the new order instead of sorting and copying the whole frame again.
+    """
+    order, valid_count = frame_cache.get(df, ("sort", column), lambda: _ascending_order(df, column))
+    if ascending:
+        return order
+    # The descending order is the reversed ascending one, except for the missing values at the end
+    return np.concatenate([order[:valid_count][::-1], order[valid_count:]])
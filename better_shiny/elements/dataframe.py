@@ -1,13 +1,22 @@
+import math
 from dataclasses import dataclass
+from typing import Callable, Hashable
 
 from dominate import tags
+from dominate.util import raw
 
 from better_shiny import reactive
+from better_shiny.elements._filtering import filter_mask
+from better_shiny.elements._sort_cache import sorted_positions
+from better_shiny.elements._table_html import table_rows_html
 from better_shiny.reactive import on
+from better_shiny.utils import set_timeout
 
 try:
+    import numpy as np
     import pandas as pd
 except ImportError:
+    np = None
     pd = None
 
 
@@ -21,17 +30,50 @@ class Sorting:
 @reactive.dynamic()
 def pandas_element(
         df: pd.DataFrame,
+        page_size: int | None = None,
+        filterable: bool = False,
+        debounce: float = 0.3,
 ) -> tags.table:
+    """
+    Display a DataFrame in a table which can be sorted by clicking on the column headers.
+    :param df: The DataFrame to display.
+    :param page_size: The number of rows on a page, only the rows of the current page are rendered and sent to the
+        browser. None (the default) displays all rows.
+    :param filterable: Display a search box and a filter for every column. Numeric columns can be filtered by
+        comparisons (e.g. ">= 5") and ranges (e.g. "1..10"), the other filters match values containing the text.
+    :param debounce: Seconds without typing after which the search and the filters are applied.
+    """
     if pd is None:
         raise ImportError("Pandas is not installed")
 
     sorting = reactive.Value(Sorting(column=None, ascending=True, reset_on_change=False))
+    page = reactive.Value(0)
+    search = reactive.Value("")
+    column_filters = reactive.Value({})
+    # The number of inputs of the search box and each filter, only the last input is applied
+    input_counts = reactive.StableValue({})
 
+    # The positions of the rows in the order they are displayed, None keeps the order of the DataFrame
+    positions = None
     if sorting().column is not None:
-        df = df.sort_values(by=sorting().column, ascending=sorting().ascending)
+        positions = sorted_positions(df, sorting().column, sorting().ascending)
+    if filterable:
+        mask = filter_mask(df, search(), column_filters())
+        if mask is not None:
+            positions = np.flatnonzero(mask) if positions is None else positions[mask[positions]]
 
+    row_count = len(df) if positions is None else len(positions)
+    page_count = max(1, math.ceil(row_count / page_size)) if page_size else 1
+    # The DataFrame may have fewer rows than when the page was selected
+    current_page = min(page(), page_count - 1)
+    first_row = current_page * page_size if page_size else 0
+    last_row = min(first_row + page_size, row_count) if page_size else row_count
+
+    @reactive.batch()
     def adjust_sorting(_, sorting_column: str):
-        sorting_value = sorting.value_non_reactive
+        # The rows of the current page are different ones after sorting
+        page.set(0)
+        sorting_value = sorting.get()
         if sorting_value.column == sorting_column:
             if sorting_value.reset_on_change:
                 sorting.set(Sorting(column=None, ascending=True, reset_on_change=False))
@@ -40,9 +82,40 @@ def pandas_element(
         else:
             sorting.set(Sorting(column=sorting_column, ascending=True, reset_on_change=False))
 
+    def change_page(_, offset: int):
+        page.set(max(0, min(current_page + offset, page_count - 1)))
+
+    def apply_after_debounce(input_key: Hashable, apply: Callable[[], None]) -> None:
+        input_count = input_counts.get().get(input_key, 0) + 1
+        input_counts.get()[input_key] = input_count
+
+        def apply_last_input():
+            if input_counts.get()[input_key] != input_count:
+                return
+            with reactive.batch():
+                # The rows of the current page may not match anymore
+                page.set(0)
+                apply()
+
+        set_timeout(apply_last_input, debounce)
+
+    def change_search(event, _):
+        text = event.get("value", "")
+        apply_after_debounce("search", lambda: search.set(text))
+
+    def change_column_filter(event, column: Hashable):
+        text = event.get("value", "")
+        apply_after_debounce(("column", column), lambda: column_filters.set({**column_filters.get(), column: text}))
+
     table = tags.table()
     with table:
         with tags.thead():
+            if filterable:
+                with tags.tr():
+                    with tags.th(colspan=len(df.columns)):
+                        with tags.input_(type="search", placeholder="Search", value=search()):
+                            on("input", handler=change_search)
+
             with tags.tr():
                 for column in df.columns:
                     with tags.th():
@@ -56,9 +129,28 @@ def pandas_element(
                                 tags.i("▼", cls=f"select-none ml-1 {color}")
                             on("click", data=column, handler=adjust_sorting)
 
+            if filterable:
+                with tags.tr():
+                    for column in df.columns:
+                        with tags.th():
+                            column_filter = column_filters().get(column, "")
+                            with tags.input_(type="search", placeholder="Filter", value=column_filter):
+                                on("input", data=column, handler=change_column_filter)
+
         with tags.tbody():
-            for row in df.itertuples():
+            # The rows are rendered column by column, creating a tag per cell is too slow for large frames
+            # Only the rows of the current page are selected, the DataFrame is never sorted as a whole
+            rows = df.iloc[first_row:last_row] if positions is None else df.iloc[positions[first_row:last_row]]
+            raw(table_rows_html([rows.iloc[:, index].tolist() for index in range(len(df.columns))]))
+
+        if page_count > 1:
+            with tags.tfoot():
                 with tags.tr():
-                    for value in row[1:]:
-                        tags.td(value)
+                    with tags.td(colspan=len(df.columns)):
+                        with tags.div(cls="flex items-center"):
+                            with tags.button("‹", disabled=current_page == 0):
+                                on("click", data=-1, handler=change_page)
+                            tags.span(f"Rows {first_row + 1}-{last_row} of {row_count}", cls="px-1")
+                            with tags.button("›", disabled=current_page == page_count - 1):
+                                on("click", data=1, handler=change_page)
     return table
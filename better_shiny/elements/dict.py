@@ -1,6 +1,6 @@
 from typing import List, Any, Dict
 
-from better_shiny.elements import pandas_element
+from better_shiny.elements.dataframe import pandas_element
 
 try:
     import pandas as pd
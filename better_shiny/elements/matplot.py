@@ -1,58 +1,367 @@
-import base64
+import asyncio
+import datetime
+import hashlib
 import io
-from typing import Any
+import multiprocessing
+import numbers
+import threading
+import types
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Hashable, Callable
 
 from dominate.tags import img
 
+from ..utils.blob_store import blob_store
+
 try:
+    import numpy
     from matplotlib import pyplot
+    from matplotlib.artist import Artist
+    from matplotlib.colors import Colormap, Normalize
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import TickHelper
 except ImportError:
+    numpy = None
     pyplot = None
+    Artist = None
+    Colormap = None
+    Normalize = None
+    Figure = None
+    TickHelper = None
+
+# The properties of the artists which determine how a figure looks, used to recognize figures which did not change
+_ARTIST_GETTERS = (
+    "get_xydata", "get_offsets", "get_array", "get_sizes", "get_paths", "get_facecolor", "get_edgecolor",
+    "get_linewidth", "get_linestyle", "get_color", "get_marker", "get_markersize", "get_alpha", "get_visible",
+    "get_zorder", "get_text", "get_fontsize", "get_fontweight", "get_rotation", "get_ha", "get_va", "get_xlim",
+    "get_ylim", "get_xscale", "get_yscale", "get_label", "get_xy", "get_width", "get_height", "get_extent",
+    "get_cmap", "get_clim", "get_size_inches", "get_dpi", "get_position",
+)
+# The tick labels are only created when the figure is drawn, so the objects which create them are hashed instead
+_AXIS_GETTERS = ("get_major_formatter", "get_minor_formatter", "get_major_locator", "get_minor_locator")
 
 
-def _plt_to_data_uri(plt: Any, dpi: int) -> str:
+class _PlotCache:
     """
-    Convert the given matplotlib figure into a base64-encoded PNG image data URI.
-    :param plt: The matplotlib figure to convert.
-    :return: The base64-encoded PNG image data URI.
+    Maps the keys of rendered plots to their names in the blob store, the plots which were least recently used are
+    removed first. It is shared by all sessions, so a plot which is displayed in many sessions is only rendered once.
+    """
+
+    def __init__(self, max_plots: int):
+        self.max_plots = max_plots
+        self._plots: OrderedDict[Hashable, str] = OrderedDict()
+        # Plots may be rendered concurrently in the render executor
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> str | None:
+        with self._lock:
+            name = self._plots.get(key)
+            if name is None:
+                return None
+            self._plots.move_to_end(key)
+        # The blob store may have removed the plot to make space for other blobs
+        return name if blob_store.get(name) is not None else None
+
+    def put(self, key: Hashable, name: str) -> None:
+        with self._lock:
+            self._plots[key] = name
+            self._plots.move_to_end(key)
+            while len(self._plots) > self.max_plots:
+                self._plots.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plots.clear()
+
+
+_plot_cache = _PlotCache(max_plots=4096)
+
+
+_plot_pool: ProcessPoolExecutor | None = None
+_plot_pool_workers: int | None = None
+
+
+def configure_plot_cache(max_bytes: int | None = None, directory: str | Path | None = None) -> None:
+    """
+    Change the maximal total size of the blob store the rendered plots are kept in, or the directory it writes them
+    to. Defaults to 64 MiB and the environment variable BETTER_SHINY_BLOB_STORE (~/.cache/better_shiny/blobs if not
+    set). All workers of the app have to use the same directory.
+    """
+    blob_store.configure(max_bytes, directory)
+    _plot_cache.clear()
+
+
+def configure_plot_pool(max_workers: int | None) -> None:
+    """
+    Change the number of processes matplot_element_async renders the plots in, None uses one per CPU.
+    """
+    global _plot_pool, _plot_pool_workers
+    if _plot_pool is not None:
+        _plot_pool.shutdown(wait=False)
+        _plot_pool = None
+    _plot_pool_workers = max_workers
+
+
+def _get_plot_pool() -> ProcessPoolExecutor:
+    global _plot_pool
+    if _plot_pool is None:
+        # Forking the server process would copy locks which other threads (the event loop, the render executor)
+        # hold at that moment, and the workers could deadlock on them
+        _plot_pool = ProcessPoolExecutor(
+            max_workers=_plot_pool_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _plot_pool
+
+
+def _hash_value(hasher: Any, value: Any) -> bool:
+    """
+    Hash a property of an artist.
+    :return: False if the value is of a type whose hash would not reflect how it looks, the figure is not cached then.
+    """
+    if isinstance(value, numpy.ndarray):
+        hasher.update(f"{value.dtype}{value.shape}".encode())
+        hasher.update(numpy.ascontiguousarray(value).tobytes())
+        return True
+    if value is None or isinstance(value, (str, numbers.Number, range, datetime.date, datetime.tzinfo)):
+        hasher.update(repr(value).encode())
+        return True
+    if isinstance(value, (tuple, list)):
+        hasher.update(b"(")
+        hashed = all(_hash_value(hasher, item) for item in value)
+        hasher.update(b")")
+        return hashed
+    if isinstance(value, dict):
+        return all(_hash_value(hasher, item) for item in value.items())
+    if hasattr(value, "vertices"):
+        # Path
+        return _hash_value(hasher, value.vertices) and _hash_value(hasher, value.codes)
+    if hasattr(value, "bounds"):
+        # Bbox
+        return _hash_value(hasher, tuple(value.bounds))
+    if isinstance(value, types.FunctionType):
+        # Functions (e.g. of a FuncFormatter) are identified by their code and the values they close over
+        hasher.update(f"{value.__module__}.{value.__qualname__}".encode())
+        hasher.update(value.__code__.co_code)
+        return (
+            _hash_value(hasher, value.__code__.co_consts)
+            and _hash_value(hasher, value.__defaults__)
+            and _hash_value(hasher, [cell.cell_contents for cell in value.__closure__ or ()])
+        )
+    if isinstance(value, Colormap):
+        # Colormaps with the same name may be resampled or have other colors for bad values
+        hasher.update(value.name.encode())
+        return _hash_value(hasher, value(numpy.linspace(0, 1, value.N))) and _hash_value(
+            hasher, [value.get_bad(), value.get_over(), value.get_under()]
+        )
+    if isinstance(value, Normalize):
+        return _hash_norm(hasher, value)
+    if isinstance(value, TickHelper):
+        return _hash_state(hasher, value)
+    if isinstance(value, Artist):
+        # Artists (e.g. the label of an axis) are hashed on their own, figure_hash visits all of them
+        hasher.update(type(value).__name__.encode())
+        return True
+    return False
+
+
+def _hash_norm(hasher: Any, norm: Any) -> bool:
+    # The type tells linear and logarithmic norms apart. The parameters of the other norms (the center of a
+    # TwoSlopeNorm, the exponent of a PowerNorm, ...) are covered by the values the norm maps samples to.
+    hasher.update(f"{type(norm).__module__}.{type(norm).__qualname__}".encode())
+    if not _hash_value(hasher, [norm.vmin, norm.vmax, norm.clip]):
+        return False
+    if not norm.scaled():
+        # The limits are taken from the data when the figure is drawn
+        return True
+    try:
+        samples = numpy.ma.masked_invalid(norm(numpy.linspace(norm.vmin, norm.vmax, 257)), copy=False)
+    except Exception:
+        return False
+    return _hash_value(hasher, numpy.ma.filled(samples.astype(float), numpy.nan))
+
+
+def _hash_state(hasher: Any, obj: Any) -> bool:
+    # Formatters and locators keep their settings in their attributes, the axis is a reference back to the figure
+    hasher.update(type(obj).__name__.encode())
+    for name, value in sorted(getattr(obj, "__dict__", {}).items()):
+        if name != "axis":
+            hasher.update(name.encode())
+            if not _hash_value(hasher, value):
+                return False
+    return True
+
+
+def figure_hash(figure: Any) -> str | None:
+    """
+    Hash the data and the properties of all artists of the figure, the tick formatters and locators of its axes and
+    the layout of the subplots. This is much faster than rendering the figure, so it is used to find out if a figure
+    looks the same as one which was rendered before.
+    :param figure: The matplotlib figure.
+    :return: The hash, or None if a property has a type which cannot be hashed reliably.
     """
-    # Create a buffer to hold the PNG image data
+    hasher = hashlib.sha256()
+    parameters = figure.subplotpars
+    _hash_value(hasher, [parameters.left, parameters.right, parameters.bottom, parameters.top])
+    _hash_value(hasher, [parameters.wspace, parameters.hspace])
+    _hash_value(hasher, type(figure.get_layout_engine()).__name__)
+    for artist in figure.findobj(include_self=True):
+        hasher.update(type(artist).__name__.encode())
+        for getter in _ARTIST_GETTERS:
+            method = getattr(artist, getter, None)
+            if method is None:
+                continue
+            try:
+                value = method()
+            except Exception:
+                continue
+            hasher.update(getter.encode())
+            if not _hash_value(hasher, value):
+                return None
+        # Images and collections map their data to colors with a norm, it has no getter
+        if isinstance(getattr(artist, "norm", None), Normalize):
+            hasher.update(b"norm")
+            if not _hash_norm(hasher, artist.norm):
+                return None
+        if hasattr(artist, "get_major_formatter"):
+            for getter in _AXIS_GETTERS:
+                if not _hash_state(hasher, getattr(artist, getter)()):
+                    return None
+    return hasher.hexdigest()
 
+
+def _hash_argument(hasher: Any, value: Any) -> bool:
+    """
+    Hash an argument of a function which builds a figure.
+    :return: False if the argument is not a plain value whose hash stays the same across processes.
+    """
+    if value is None or isinstance(value, (str, bytes, numbers.Number)):
+        hasher.update(f"{type(value).__name__}:{value!r}".encode())
+        return True
+    if isinstance(value, (tuple, list)):
+        hasher.update(f"{type(value).__name__}:{len(value)}".encode())
+        return all(_hash_argument(hasher, item) for item in value)
+    if isinstance(value, dict):
+        hasher.update(f"dict:{len(value)}".encode())
+        return all(_hash_argument(hasher, key) and _hash_argument(hasher, item) for key, item in value.items())
+    if isinstance(value, numpy.ndarray) and value.dtype != object:
+        return _hash_value(hasher, value)
+    return False
+
+
+def _build_figure_key(build_figure: Callable[..., Any], args: tuple, kwargs: dict) -> str | None:
+    """
+    The key of the figure built by the function with the arguments. It contains the code of the function, so a
+    changed function does not use the cached plots of the old one.
+    :return: None if the function or an argument cannot be hashed, the figure is not cached then.
+    """
+    hasher = hashlib.sha256()
+    if not _hash_value(hasher, build_figure) or not _hash_argument(hasher, (args, kwargs)):
+        return None
+    return hasher.hexdigest()
+
+
+def _plt_to_png(plt: Any, dpi: int) -> bytes:
+    """
+    Convert the given matplotlib figure into a PNG image.
+    :param plt: The matplotlib figure to convert.
+    :return: The PNG image data.
+    """
     buf = io.BytesIO()
 
     # Render the figure onto the canvas, use as little space as possible
     plt.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
-    plt.close()
+    return buf.getvalue()
 
-    # Get the PNG image data from the buffer
-    buf.seek(0)
-    png_data = buf.getvalue()
 
-    # Encode the PNG image data into base64
-    encoded_png_data = base64.b64encode(png_data).decode("utf-8")
-
-    # Build the data URI with the base64-encoded PNG data
-    data_uri = f"data:image/png;base64,{encoded_png_data}"
-
-    return data_uri
+def _build_png(build_figure: Callable[..., Any], args: tuple, kwargs: dict, dpi: int | None) -> bytes:
+    # Runs in the process pool. The figure is created without pyplot, whose global state is not thread safe.
+    figure = Figure()
+    build_figure(figure, *args, **kwargs)
+    return _plt_to_png(figure, dpi)
 
 
 def matplot_element(
     plt: pyplot,
     dpi: int | None = None,
+    cache_key: Hashable | None = None,
 ) -> img:
     """
-    Convert the given matplotlib figure into a DOM element.
+    Convert the given matplotlib figure into a DOM element. The image is served by the app under an url that contains
+    the hash of its content. Rendered figures are cached, a figure whose artists have the same data and properties as
+    a cached one is not rendered again. Figures with properties of types the hash does not know about are only cached
+    if a cache_key is given.
     :param dpi: The DPI to use for the conversion.
-    :param plt: The matplotlib figure to convert.
+    :param plt: The matplotlib figure (or pyplot, for the current figure) to convert.
+    :param cache_key: Identifies the figure in the cache instead of the hash of its artists, e.g. the arguments the
+        figure was created with.
     :return: The DOM element containing the figure.
     """
 
     if pyplot is None:
         raise ImportError("Matplotlib is not installed")
 
-    plt_data_uri = _plt_to_data_uri(plt, dpi)
+    figure = plt.gcf() if plt is pyplot else plt
+    if cache_key is None:
+        cache_key = figure_hash(figure)
+    key = (cache_key, dpi) if cache_key is not None else None
+    name = _plot_cache.get(key) if key is not None else None
+    if name is None:
+        name = blob_store.put(_plt_to_png(figure, dpi), "png")
+        if key is not None:
+            _plot_cache.put(key, name)
+    pyplot.close(figure)
+
+    # The image is loaded from the app, so re-renders do not send it again and browsers cache it
+    return img(
+        src=blob_store.url(name),
+    )
+
+
+async def matplot_element_async(
+    build_figure: Callable[..., Any],
+    *args: Any,
+    dpi: int | None = None,
+    cache_key: Hashable | None = None,
+    **kwargs: Any,
+) -> img:
+    """
+    Render a figure in a process pool, that way plots use all cores and do not block the event loop. Use it in async
+    dynamic functions. The figure is built with the object oriented API of matplotlib:
+
+        def scatter_plot(figure: Figure, x: list[float], y: list[float]) -> None:
+            ax = figure.add_subplot()
+            ax.scatter(x, y)
+
+        matplot_element_async(scatter_plot, x, y)
+
+    :param build_figure: Draws onto the figure it is called with, followed by args and kwargs. It has to be defined
+        in the module scope, so it can be sent to the process pool. The worker processes are started fresh and
+        import its module again, a script which starts the app has to do that under `if __name__ == "__main__":`.
+    :param args: Passed on to build_figure, they have to be picklable.
+    :param dpi: The DPI to use for the conversion.
+    :param cache_key: Identifies the figure in the cache instead of the hash of build_figure and its arguments.
+        Figures are only cached without it if all arguments are numbers, strings, bytes, numpy arrays or lists,
+        tuples and dicts of those.
+    :param kwargs: Passed on to build_figure, they have to be picklable.
+    :return: The DOM element containing the figure.
+    """
+    if pyplot is None:
+        raise ImportError("Matplotlib is not installed")
+
+    if cache_key is None:
+        cache_key = _build_figure_key(build_figure, args, kwargs)
+    key = (cache_key, dpi) if cache_key is not None else None
+    name = _plot_cache.get(key) if key is not None else None
+    if name is None:
+        png = await asyncio.get_running_loop().run_in_executor(
+            _get_plot_pool(), _build_png, build_figure, args, kwargs, dpi
+        )
+        name = blob_store.put(png, "png")
+        if key is not None:
+            _plot_cache.put(key, name)
 
     return img(
-        src=plt_data_uri,
+        src=blob_store.url(name),
     )
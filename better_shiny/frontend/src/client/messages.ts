@@ -18,9 +18,78 @@ export interface ResponseReRender {
   html: string;
 }
 
+export interface PatchSetAttribute {
+  op: "set-attr";
+  path: number[];
+  name: string;
+  value: string;
+}
+
+export interface PatchRemoveAttribute {
+  op: "remove-attr";
+  path: number[];
+  name: string;
+}
+
+export interface PatchReplaceText {
+  op: "replace-text";
+  path: number[];
+  text: string;
+}
+
+export interface PatchReplace {
+  op: "replace";
+  path: number[];
+  html: string;
+}
+
+export interface PatchSetHtml {
+  op: "set-html";
+  path: number[];
+  html: string;
+}
+
+export interface PatchInsertChild {
+  op: "insert-child";
+  path: number[];
+  index: number;
+  html: string;
+}
+
+export interface PatchRemoveChild {
+  op: "remove-child";
+  path: number[];
+  index: number;
+  count: number;
+}
+
+export type Patch =
+  | PatchSetAttribute
+  | PatchRemoveAttribute
+  | PatchReplaceText
+  | PatchReplace
+  | PatchSetHtml
+  | PatchInsertChild
+  | PatchRemoveChild;
+
+export interface ResponsePatch {
+  type: "patch@response";
+  id: string;
+  patches: Patch[];
+}
+
+export interface ResponseBinding {
+  type: "binding@response";
+  id: string;
+  // null for text bindings
+  attribute: string | null;
+  // null removes the attribute
+  value: string | null;
+}
+
 export interface ResponseError {
   type: "error@response";
   error: string;
 }
 
-export type BetterShinyResponses = ResponseReRender | ResponseError;
+export type BetterShinyResponses = ResponseReRender | ResponsePatch | ResponseBinding | ResponseError;
@@ -1,13 +1,29 @@
 import { createClient } from "./client";
 import { stringifyEvent } from "./stringify.ts";
 
-export const reRegisterEvents = async (element: HTMLElement) => {
+// The event each element currently listens on. Handler ids are positional, so a handler which stays attached
+// after the server removed it would send an id which now belongs to another element.
+const registeredEvents = new WeakMap<Element, string>();
+
+const detach = (element: Element) => {
+  const event = registeredEvents.get(element);
+  if (event === undefined) return;
+  (element as any)[`on${event}`] = null;
+  registeredEvents.delete(element);
+};
+
+export const reRegisterEvents = async (element: Element) => {
   const client = await createClient();
 
-  const elementsToRegister = element.querySelectorAll("[data-listen-on-event='true']");
+  const selector = "[data-listen-on-event='true']";
+  // The root may have been patched and no longer listen on any event
+  if (!element.matches(selector)) detach(element);
+
+  const elementsToRegister = [...(element.matches(selector) ? [element] : []), ...element.querySelectorAll(selector)];
   for (const element of elementsToRegister) {
     const handler = element.getAttribute("data-listen-on-event-handler");
-    const event = element.getAttribute(`data-${handler}`);
+    const event = handler && element.getAttribute(`data-${handler}`);
+    if (registeredEvents.get(element) !== event) detach(element);
     if (!event || !handler) continue;
 
     (element as any)[`on${event}`] = (event: Event) =>
@@ -17,5 +33,6 @@ export const reRegisterEvents = async (element: HTMLElement) => {
         event_handler_id: handler,
         id: element.getAttribute("data-dynamic-function-id")!,
       });
+    registeredEvents.set(element, event);
   }
 };
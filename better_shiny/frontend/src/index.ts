@@ -1,7 +1,7 @@
 import "./index.css";
 
 import { createClient } from "./client";
-import { errorResponseHandler, rerenderHandler } from "./message-handlers";
+import { bindingHandler, errorResponseHandler, patchHandler, rerenderHandler } from "./message-handlers";
 import { retryEvery } from "./utils";
 import { populateLazyData } from "./lazy";
 import { reRegisterEvents } from "./events.ts";
@@ -13,6 +13,12 @@ window.onload = async () => {
       case "rerender@response":
         rerenderHandler(message);
         break;
+      case "patch@response":
+        void patchHandler(message);
+        break;
+      case "binding@response":
+        bindingHandler(message);
+        break;
       case "error@response":
         errorResponseHandler(message);
         break;
@@ -1,9 +1,11 @@
 import { createClient } from "./client";
 
-export const populateLazyData = async (rootElement: HTMLElement) => {
+export const populateLazyData = async (rootElement: Element, includeRoot = false) => {
   const client = await createClient();
+  const selector = "[data-server-rendered='true'][data-lazy='true']";
   const elementsToRenderOnTheServer = [
-    ...rootElement.querySelectorAll("[data-server-rendered='true'][data-lazy='true']"),
+    ...(includeRoot && rootElement.matches(selector) ? [rootElement] : []),
+    ...rootElement.querySelectorAll(selector),
   ];
   for (const element of elementsToRenderOnTheServer) {
     client.send({
@@ -1,6 +1,7 @@
-import { ResponseError, ResponseReRender } from "./client";
+import { createClient, ResponseBinding, ResponseError, ResponsePatch, ResponseReRender } from "./client";
 import { populateLazyData } from "./lazy.ts";
 import { reRegisterEvents } from "./events.ts";
+import { applyPatches } from "./patch.ts";
 
 export const rerenderHandler = (data: ResponseReRender) => {
   const html = data.html;
@@ -15,6 +16,52 @@ export const rerenderHandler = (data: ResponseReRender) => {
     console.log(`Rerendered ${id} in ${Date.now() - startTime}ms`);
 };
 
+export const patchHandler = async (data: ResponsePatch) => {
+  const id = data.id;
+  const startTime = Date.now();
+  const element = document.getElementById(id);
+  if (!element) return;
+
+  try {
+    const { created, changed, refilled } = applyPatches(element, data.patches);
+    // Only new content contains lazy outlets which still have to be fetched. The server renders the outlets
+    // which already were on the page by itself.
+    for (const createdElement of created) {
+      void populateLazyData(createdElement, true);
+      void reRegisterEvents(createdElement);
+    }
+    for (const refilledElement of refilled) {
+      void populateLazyData(refilledElement);
+      void reRegisterEvents(refilledElement);
+    }
+    for (const changedElement of changed) {
+      void reRegisterEvents(changedElement);
+    }
+  } catch (e) {
+    // The content of the element diverged from the one the server knows about, so request the complete html
+    console.warn(`Could not patch ${id}, requesting a complete re-render`, e);
+    const client = await createClient();
+    client.send({ type: "rerender@request", id });
+  }
+  console.log(`Patched ${id} with ${data.patches.length} patches in ${Date.now() - startTime}ms`);
+};
+
+export const bindingHandler = (data: ResponseBinding) => {
+  if (data.attribute === null) {
+    const element = document.querySelector(`[data-bind-text="${data.id}"]`);
+    if (element) element.textContent = data.value ?? "";
+    return;
+  }
+
+  const element = document.querySelector(`[data-bind-attr-${data.attribute}="${data.id}"]`);
+  if (!element) return;
+  if (data.value === null) {
+    element.removeAttribute(data.attribute);
+  } else {
+    element.setAttribute(data.attribute, data.value);
+  }
+};
+
 export const errorResponseHandler = (data: ResponseError) => {
   console.error(data.error);
 };
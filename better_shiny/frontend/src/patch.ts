@@ -0,0 +1,93 @@
+import { Patch } from "./client";
+
+export class PatchError extends Error {}
+
+// Whitespace only text nodes are created by pretty printing on the server and are not addressed by patches
+const isSignificant = (node: Node): boolean => {
+  if (node.nodeType === Node.COMMENT_NODE) return false;
+  return !(node.nodeType === Node.TEXT_NODE && /^\s*$/.test(node.textContent ?? ""));
+};
+
+const significantChildren = (node: Node): Node[] => [...node.childNodes].filter(isSignificant);
+
+const resolvePath = (root: Node, path: number[]): Node => {
+  let node = root;
+  for (const index of path) {
+    const child = significantChildren(node)[index];
+    if (!child) throw new PatchError(`Could not resolve path ${path.join("/")}`);
+    node = child;
+  }
+  return node;
+};
+
+const parseHtml = (html: string): Node[] => {
+  const template = document.createElement("template");
+  template.innerHTML = html;
+  return [...template.content.childNodes];
+};
+
+const asElement = (node: Node): Element => {
+  if (!(node instanceof Element)) throw new PatchError(`Expected an element, got ${node.nodeName}`);
+  return node;
+};
+
+export interface PatchResult {
+  // Elements which were inserted into the document
+  created: Element[];
+  // Elements whose attributes changed
+  changed: Element[];
+  // Elements whose content was replaced
+  refilled: Element[];
+}
+
+/**
+ * Apply the patches in order to the content of the root element.
+ * @return The elements which were touched and therefore have to be re-registered.
+ */
+export const applyPatches = (root: HTMLElement, patches: Patch[]): PatchResult => {
+  const created: Element[] = [];
+  const changed: Element[] = [];
+  const refilled: Element[] = [];
+  const elementsOf = (nodes: Node[]) => nodes.filter((n): n is Element => n instanceof Element);
+
+  for (const patch of patches) {
+    const node = resolvePath(root, patch.path);
+    switch (patch.op) {
+      case "set-attr":
+        asElement(node).setAttribute(patch.name, patch.value);
+        changed.push(asElement(node));
+        break;
+      case "remove-attr":
+        asElement(node).removeAttribute(patch.name);
+        changed.push(asElement(node));
+        break;
+      case "replace-text":
+        node.textContent = patch.text;
+        break;
+      case "replace": {
+        const nodes = parseHtml(patch.html);
+        (node as ChildNode).replaceWith(...nodes);
+        created.push(...elementsOf(nodes));
+        break;
+      }
+      case "set-html":
+        asElement(node).innerHTML = patch.html;
+        refilled.push(asElement(node));
+        break;
+      case "insert-child": {
+        const nodes = parseHtml(patch.html);
+        const reference = significantChildren(node)[patch.index] ?? null;
+        for (const child of nodes) node.insertBefore(child, reference);
+        created.push(...elementsOf(nodes));
+        break;
+      }
+      case "remove-child": {
+        const children = significantChildren(node).slice(patch.index, patch.index + patch.count);
+        if (children.length !== patch.count) throw new PatchError(`Could not remove ${patch.count} children`);
+        for (const child of children) node.removeChild(child);
+        break;
+      }
+    }
+  }
+  return { created, changed, refilled };
+};
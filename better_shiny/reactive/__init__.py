@@ -1,5 +1,8 @@
 from .dynamic import dynamic
 from .event import on
 from .value import Value, ValueSubscription, on_update
+from .computed import Computed
+from .resource import Resource
 from .stable_value import StableValue
 from .lifecycle import on_mount, on_unmount
+from .batch import batch
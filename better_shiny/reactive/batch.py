@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import functools
+import inspect
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .value import Value
+
+# The values which were changed in the currently open batch. None if no batch is open.
+_pending_values: ContextVar[Dict["Value", None] | None] = ContextVar("pending_values", default=None)
+
+
+class batch(ContextDecorator):
+    """
+    Collect all changes of reactive values and notify the subscribers of every changed value once the batch is done.
+    This way a handler which updates several values only causes a single render of the affected dynamic functions.
+
+    Can be used as a context manager (``with reactive.batch(): ...``) or as a decorator (``@reactive.batch()``),
+    also of async functions. Nested batches are merged into the outermost one.
+    """
+
+    def __init__(self):
+        # Nested `with` statements may enter the same instance again
+        self._tokens = []
+
+    def _recreate_cm(self) -> batch:
+        # Every call of a decorated function gets its own batch. Calls which run concurrently in different threads
+        # must not share the tokens, they belong to different contexts.
+        return batch()
+
+    def __call__(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        if not inspect.iscoroutinefunction(fn):
+            return super().__call__(fn)
+
+        # The batch has to be open while the coroutine runs, not only while it is created. Calls which run
+        # concurrently in different tasks each get their own batch, their tokens belong to different contexts.
+        @functools.wraps(fn)
+        async def inner(*args: Any, **kwargs: Any) -> Any:
+            with batch():
+                return await fn(*args, **kwargs)
+
+        return inner
+
+    def __enter__(self) -> batch:
+        self._tokens.append(_pending_values.set({}) if _pending_values.get() is None else None)
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        token = self._tokens.pop()
+        if token is None:
+            # Nested batch, the outermost batch notifies the subscribers
+            return False
+
+        values = _pending_values.get()
+        _pending_values.reset(token)
+        # The values have been changed, so the subscribers are notified even if the batch raised an exception
+        for value in values:
+            # noinspection PyProtectedMember
+            value._notify()
+        return False
+
+
+def defer_notification(value: "Value") -> bool:
+    """
+    Add the value to the open batch.
+    :return: True if the notification of the subscribers is deferred until the batch is done, False if no batch is open.
+    """
+    pending = _pending_values.get()
+    if pending is None:
+        return False
+    pending[value] = None
+    return True
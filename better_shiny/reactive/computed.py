@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from typing import Callable, TypeVar, Dict, Tuple, Any
+
+from .batch import defer_notification
+from .value import Value, ValueSubscription, track_dependencies
+
+T = TypeVar("T")
+
+
+class Computed(Value[T]):
+    """
+    A value which is derived from other values. The function is called lazily the first time the value is read and
+    its result is cached until one of the values it read changes. Dynamic functions which call the computed value are
+    re-rendered when it changes, the same way they are for a Value.
+
+    The function is only replaced on a re-render of the owning dynamic function if its code or the variables it
+    closes over changed.
+    """
+
+    def __init__(self, fn: Callable[[], T], name: str = ""):
+        super().__init__(None, name)
+        self._fn = fn
+        self._fn_inputs = _function_inputs(fn)
+        self._stale = True
+        self._dependencies: Dict[Value, ValueSubscription] = {}
+
+    def _read(self) -> T:
+        if self._stale:
+            self._compute()
+        return self._value
+
+    def _rerender(self, fn: Callable[[], T], name: str = "") -> None:
+        fn_inputs = _function_inputs(fn)
+        if fn.__code__ is self._fn.__code__ and _all_identical(fn_inputs, self._fn_inputs):
+            return
+
+        self._fn = fn
+        self._fn_inputs = fn_inputs
+        # The owning dynamic function is being rendered and reads the new result, notifying it would only cause
+        # another render
+        self._stale = True
+
+    def _compute(self) -> None:
+        result, dependencies = track_dependencies(self._fn)
+
+        for dependency in list(self._dependencies):
+            if dependency not in dependencies:
+                self._dependencies.pop(dependency).unsubscribe()
+        for dependency in dependencies:
+            if dependency not in self._dependencies and dependency is not self:
+                self._dependencies[dependency] = dependency.on_update(self._invalidate)
+
+        self._old_value = self._value
+        self._value = result
+        self._stale = False
+
+    def _invalidate(self, _: Value) -> None:
+        if self._stale:
+            # The subscribers have already been notified and nobody read the value since
+            return
+
+        self._stale = True
+        if defer_notification(self):
+            return
+        self._notify()
+
+    def set(self, value: T) -> None:
+        raise ValueError("A Computed value cannot be set, change the values it is computed from instead")
+
+    def destroy(self) -> None:
+        for subscription in self._dependencies.values():
+            subscription.unsubscribe()
+        self._dependencies.clear()
+        super().destroy()
+
+    def __repr__(self) -> str:
+        value = "<not computed>" if self._stale else self._value.__repr__()
+        return f"{self._name}: {value}"
+
+
+_EMPTY_CELL = object()
+
+
+def _function_inputs(fn: Callable[..., Any]) -> Tuple[Any, ...]:
+    closure = tuple(_cell_contents(cell) for cell in fn.__closure__ or ())
+    return *closure, *(fn.__defaults__ or ())
+
+
+def _cell_contents(cell: Any) -> Any:
+    try:
+        return cell.cell_contents
+    except ValueError:
+        # The variable has not been assigned yet
+        return _EMPTY_CELL
+
+
+def _all_identical(a: Tuple[Any, ...], b: Tuple[Any, ...]) -> bool:
+    return len(a) == len(b) and all(x is y for x, y in zip(a, b))
@@ -1,6 +1,8 @@
 import functools
 import inspect
-from typing import Callable, TypeVar, Dict
+import itertools
+from types import CodeType
+from typing import Callable, TypeVar, Dict, Hashable, Any, Iterator, Set
 
 from dominate.dom_tag import attr
 from dominate.tags import div
@@ -11,44 +13,108 @@ from ..utils.logging import log_duration
 
 T = TypeVar("T", bound=RenderFunction)
 
-_function_call_counter: Dict[int, int] = {}
+# Sessions can be rendered concurrently, taking the next number of a counter is atomic
+_function_call_counter: Dict[int, Iterator[int]] = {}
+# The code objects of all functions decorated with @dynamic
+_dynamic_function_codes: Set[CodeType] = set()
 
 
-def dynamic(lazy: bool = False) -> Callable[[T], T]:
-    def wrapper(fn: T) -> T:
-        # Make sure that the function that is decorated with @dynamic is not a function inside a function
-        def _assert_not_nested() -> None:
-            if inspect.stack()[2].function != "<module>":
-                raise RuntimeError(
-                    "@dynamic can only be used on functions that are defined in the module scope. \n"
-                    f"Move the function {fn.__name__} to the module scope. "
-                )
+def is_dynamic_function_code(code: CodeType) -> bool:
+    """
+    Check if a frame with this code object belongs to a function decorated with @dynamic.
+    """
+    return code in _dynamic_function_codes
+
+
+def _args_equal(old: Any, new: Any) -> bool:
+    if old is new:
+        return True
+    if type(old) is not type(new):
+        return False
+    try:
+        # Comparisons which do not result in a bool (numpy arrays, DataFrames, ...) are treated as unequal
+        return (old == new) is True
+    except Exception:
+        return False
 
-        _assert_not_nested()
+
+def dynamic(
+        lazy: bool = False,
+        memo: bool = False,
+        args_equal: Callable[[Any, Any], bool] = _args_equal,
+) -> Callable[[T], T]:
+    """
+    Decorator for functions whose content is rendered on the server and updated when the values it uses change.
+    When a dynamic function is called inside another dynamic function, it keeps its state across re-renders of the
+    calling function. Calls are matched by their position, or by the reserved keyword argument `key` if given
+    (e.g. `row(item, key=item.id)`). Dynamic functions which are not called again are unmounted.
+    Functions defined with `async def` can await I/O. Their content is rendered after the content of the calling
+    function, the same way lazy functions are, and a newer render cancels the one which is still running.
+    :param lazy: Render the content after the page has loaded.
+    :param memo: If the calling function is re-rendered, reuse the last result of this function as long as the
+        arguments are equal and none of the values it depends on changed.
+    :param args_equal: Compares an argument of the last call with the one of the current call, used if memo is set
+        and to decide whether a lazy function has to be rendered again. Defaults to identity, or equality for arguments of the same type whose comparison results in a bool.
+    """
+    def wrapper(fn: T) -> T:
+        # Make sure that the function that is decorated with @dynamic is not a function inside a function (or class).
+        # The qualified name of those contains the names of the enclosing scopes.
+        if fn.__qualname__ != fn.__name__:
+            raise RuntimeError(
+                "@dynamic can only be used on functions that are defined in the module scope. \n"
+                f"Move the function {fn.__name__} to the module scope. "
+            )
 
         local = local_storage()
         fn_id = id(fn)
-        _function_call_counter[fn_id] = 0
+        is_async = inspect.iscoroutinefunction(fn)
+        _function_call_counter[fn_id] = itertools.count()
+        _dynamic_function_codes.add(fn.__code__)
 
         @functools.wraps(fn)
-        def inner(*args, **kwargs) -> RenderResult:
+        def inner(*args, key: Hashable | None = None, **kwargs) -> RenderResult:
             session = local.active_session()
+            parent_id = local.active_dynamic_function_id
 
-            # Add the endpoint instance to the endpoint
-            dynamic_function_id = f"{fn_id}_{_function_call_counter[fn_id]}"
-            _function_call_counter[fn_id] += 1
-            local.active_dynamic_function_id = dynamic_function_id
+            # Reuse the dynamic function which was rendered at the same place in the last render of the parent
+            dynamic_function_id = None
+            memoized_result = None
+            if parent_id is not None:
+                parent = session.get_dynamic_function(parent_id)
+                child_key, dynamic_function_id = parent.find_child(fn_id, key)
+
+            if dynamic_function_id is None:
+                # Add the endpoint instance to the endpoint
+                dynamic_function_id = f"{fn_id}_{next(_function_call_counter[fn_id])}"
+                session.create_dynamic_function(
+                    dynamic_function_id, args, kwargs, fn, fn.__name__, parent_id=parent_id
+                )
+            else:
+                dynamic_function = session.get_dynamic_function(dynamic_function_id)
+                if memo and not lazy:
+                    memoized_result = dynamic_function.memoized_result(args, kwargs, args_equal)
+                # The outlets of lazy and async functions are skipped in the diff of the parent, they render on
+                # their own. A lazy function re-renders by itself when its values change, but not its arguments.
+                if is_async and memoized_result is None:
+                    session.request_render(dynamic_function_id)
+                elif lazy and not dynamic_function.arguments_equal(args, kwargs, args_equal):
+                    session.request_render(dynamic_function_id)
+                dynamic_function.update_arguments(args, kwargs)
 
-            session.create_dynamic_function(dynamic_function_id, args, kwargs, fn, fn.__name__)
+            if parent_id is not None:
+                parent.add_child(child_key, dynamic_function_id)
 
             outlet = div(id=dynamic_function_id)
-            with outlet:
+            with local.render_context(session.session_id, dynamic_function_id), outlet:
                 attr(style="display: contents;", data_server_rendered="true")
-                if lazy:
+                if lazy or is_async:
                     attr(data_lazy="true")
+                elif memoized_result is not None:
+                    outlet.add(memoized_result)
+                    # Saves converting the unchanged content for the diff of the parent
+                    outlet.virtual_children = session.previous_render(dynamic_function_id)
                 else:
                     log_duration(session.get_dynamic_function(dynamic_function_id), fn.__name__)()
-            local.active_dynamic_function_id = None
             return outlet
 
         # Mark the function as dynamic, that way we can check if a function is decorated with @dynamic
@@ -1,4 +1,3 @@
-import uuid
 from typing import TypeVar, Callable, Dict, Any
 
 import dominate.dom_tag
@@ -13,9 +12,8 @@ def on(
     handler: Callable[[ Dict[str, Any], T], None],
     data: T | None = None,
 ) -> dominate.dom_tag.attr:
-    event_handler_id = f"{event}-{uuid.uuid4()}"
-
     function = local_storage().active_dynamic_function()
+    event_handler_id = function.create_event_handler_id(event)
     function.register_event_handler(event_handler_id, handler, data)
 
     attrs = {
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import inspect
+from concurrent.futures import Future
+from typing import Callable, TypeVar, Sequence, Any, Awaitable
+
+from .batch import defer_notification
+from .dynamic import _args_equal
+from .value import Value
+from ..utils import create_logger
+from ..utils.tasks import run_in_event_loop, call_with_render_lock
+
+T = TypeVar("T")
+logger = create_logger(__name__)
+
+
+class Resource(Value[T]):
+    """
+    A value which is loaded in the background. The fetch function runs in the render executor of the app (async
+    functions are awaited on the event loop), so the dynamic function which owns the resource renders right away and
+    can display a placeholder while the resource is loading. Once the result arrives, the dynamic function is rendered
+    again.
+
+    The resource is fetched again whenever one of the dependencies changes between two renders of the owning dynamic
+    function. A fetch which is still running is cancelled and its result is ignored. While loading, the resource keeps
+    the result of the last fetch.
+    """
+
+    def __init__(
+            self,
+            fetch_fn: Callable[[], T] | Callable[[], Awaitable[T]],
+            deps: Sequence[Any] | None = None,
+            name: str = "",
+    ):
+        super().__init__(None, name)
+        self._fetch_fn = fetch_fn
+        self._deps = tuple(deps or ())
+        self._loading = False
+        self._error: Exception | None = None
+        self._generation = 0
+        self._task: asyncio.Task | Future | None = None
+
+        # The owning dynamic function always displays the state of the resource
+        dynamic_function_id = self._local_storage.active_dynamic_function_id
+        self._local_storage.active_session().rerender_on_change(dynamic_function_id, self)
+        self._start_fetch()
+
+    @property
+    def loading(self) -> bool:
+        return self._loading
+
+    @property
+    def error(self) -> Exception | None:
+        """
+        The exception raised by the last fetch, None if it succeeded.
+        """
+        return self._error
+
+    def _rerender(
+            self,
+            fetch_fn: Callable[[], T] | Callable[[], Awaitable[T]],
+            deps: Sequence[Any] | None = None,
+            name: str = "",
+    ) -> None:
+        self._fetch_fn = fetch_fn
+        deps = tuple(deps or ())
+        if len(deps) == len(self._deps) and all(_args_equal(old, new) for old, new in zip(self._deps, deps)):
+            return
+
+        self._deps = deps
+        # The owning dynamic function is being rendered and displays the loading state, notifying it would only cause
+        # another render
+        self._start_fetch()
+
+    def refetch(self) -> None:
+        """
+        Fetch the resource again (e.g. in an event handler), cancelling the fetch which is still running.
+        """
+        self._start_fetch()
+        # Display the loading state
+        if defer_notification(self):
+            return
+        self._notify()
+
+    def _start_fetch(self) -> None:
+        self._cancel()
+        self._loading = True
+        self._task = run_in_event_loop(self._fetch(self._generation))
+
+    async def _fetch(self, generation: int) -> None:
+        try:
+            if inspect.iscoroutinefunction(self._fetch_fn):
+                result = await self._fetch_fn()
+            else:
+                app = self._local_storage.app
+                context = contextvars.copy_context()
+                result = await app.event_loop.run_in_executor(app.render_executor, context.run, self._fetch_fn)
+        except Exception as e:
+            if generation == self._generation:
+                logger.error(f"Error while fetching the resource {self._name}:")
+                logger.exception(e)
+            # The result is applied like a change of the session, so it does not run concurrently with its renders
+            await call_with_render_lock(lambda: self._resolve(generation, self._value, e))
+            return
+
+        await call_with_render_lock(lambda: self._resolve(generation, result, None))
+
+    def _resolve(self, generation: int, value: T, error: Exception | None) -> None:
+        if generation != self._generation:
+            # A newer fetch started while waiting for the lock
+            return
+        self._error = error
+        self._loading = False
+        self._task = None
+        self._old_value = self._value
+        self._value = value
+        # The loading state changed, so the subscribers are notified even if the value is the same
+        if defer_notification(self):
+            return
+        self._notify()
+
+    def _cancel(self) -> None:
+        # Results of older fetches are ignored, even if they cannot be cancelled anymore
+        self._generation += 1
+        if self._task is not None:
+            # The resource may be changed from a render in the executor, the task belongs to the event loop
+            self._local_storage.app.event_loop.call_soon_threadsafe(self._task.cancel)
+            self._task = None
+
+    def set(self, value: T) -> None:
+        raise ValueError("A Resource cannot be set, change its dependencies or call refetch instead")
+
+    def destroy(self) -> None:
+        self._cancel()
+        super().destroy()
+
+    def __repr__(self) -> str:
+        value = "<loading>" if self._loading else self._value.__repr__()
+        return f"{self._name}: {value}"
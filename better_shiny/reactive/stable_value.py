@@ -1,8 +1,9 @@
 from __future__ import annotations
 
-import inspect
+import sys
 from typing import TypeVar, Generic
 
+from .value import call_site_of
 from .._local_storage import local_storage
 
 T = TypeVar("T")
@@ -10,28 +11,15 @@ T = TypeVar("T")
 
 class _ValueMeta(type):
     def __call__(cls, *args, **kwargs):
-        # Get the line of code where the value was created at.
-        back = inspect.currentframe().f_back
-
-        # The value was called with an explicit generic type, so we have to go back one more frame
-        if back.f_globals.get("__name__") == "typing":
-            back = back.f_back
-
-        # Check if the function one back has a property called "is_reactive", for now Values can only be used in
-        # reactive functions
-
-        calling_function = back.f_globals[back.f_code.co_name]
-        if not hasattr(calling_function, "is_dynamic_function"):
-            raise ValueError("StableValue can only be used in a reactive function")
-
-        call_line = back.f_lineno
+        call_site = call_site_of(sys._getframe(1), cls.__name__)
 
         dynamic_function = local_storage().active_dynamic_function()
-        if not dynamic_function.has_stable_value(call_line):
+        instance = dynamic_function.get_stable_value(call_site)
+        if instance is None:
             instance = super(_ValueMeta, cls).__call__(*args, **kwargs)
-            dynamic_function.add_stable_value(call_line, instance)
+            dynamic_function.add_stable_value(call_site, instance)
 
-        return dynamic_function.get_stable_value(call_line)
+        return instance
 
 
 class StableValue(Generic[T], metaclass=_ValueMeta):
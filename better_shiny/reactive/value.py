@@ -1,15 +1,50 @@
 from __future__ import annotations
 
-import inspect
+import sys
 import threading
-from typing import Callable, TypeVar, Any, List, Generic
+from contextvars import ContextVar
+from types import FrameType
+from typing import Callable, TypeVar, Any, List, Generic, Dict, TYPE_CHECKING
 
+from dominate.dom_tag import attr, dom_tag
+from dominate.tags import span
+
+from .batch import defer_notification
+from .dynamic import is_dynamic_function_code
 from .._local_storage import local_storage
 from ..utils import create_logger
 
+if TYPE_CHECKING:
+    from ..communication.dynamic_function import CallSite
+
 T = TypeVar("T")
 logger = create_logger(__name__)
 
+# The values read by the computed value which is currently being calculated. None if no value is being calculated.
+_dependency_tracker: ContextVar[Dict["Value", None] | None] = ContextVar("dependency_tracker", default=None)
+
+
+def track_dependencies(fn: Callable[[], T]) -> tuple[T, List["Value"]]:
+    """
+    Call the function and record every value it reads.
+    :return: The result of the function and the values which were read.
+    """
+    dependencies: Dict[Value, None] = {}
+    token = _dependency_tracker.set(dependencies)
+    try:
+        result = fn()
+    finally:
+        _dependency_tracker.reset(token)
+    return result, list(dependencies)
+
+
+def _track_read(value: "Value") -> bool:
+    dependencies = _dependency_tracker.get()
+    if dependencies is None:
+        return False
+    dependencies[value] = None
+    return True
+
 
 class ValueSubscription:
     def __init__(self, cb: Callable[[], Any]):
@@ -19,29 +54,39 @@ class ValueSubscription:
         self._cb()
 
 
-class _ValueMeta(type):
-    def __call__(cls, *args, **kwargs):
-        # Get the line of code where the value was created at.
-        back = inspect.currentframe().f_back
-
+def call_site_of(frame: FrameType, kind: str) -> CallSite:
+    """
+    The call site which identifies a value across re-renders of the dynamic function it was created in.
+    :param frame: The frame which created the value.
+    :param kind: The name of the value class, used in the error message.
+    """
+    if not is_dynamic_function_code(frame.f_code) and frame.f_globals.get("__name__") == "typing":
         # The value was called with an explicit generic type, so we have to go back one more frame
-        if back.f_globals.get("__name__") == "typing":
-            back = back.f_back
+        frame = frame.f_back
+
+    # For now values can only be used in dynamic functions
+    if not is_dynamic_function_code(frame.f_code):
+        raise ValueError(f"{kind} can only be used in a reactive function")
+
+    # The code of the dynamic function is always the same, so the offset of the instruction identifies the call.
+    # Unlike the line number it also distinguishes values created on the same line.
+    return frame.f_lasti
 
-        # Check if the function one back has a property called "is_reactive", for now Values can only be used in
-        # reactive functions
-        calling_function = back.f_globals[back.f_code.co_name]
-        if not hasattr(calling_function, "is_dynamic_function"):
-            raise ValueError("Value can only be used in a reactive function")
 
-        call_line = back.f_lineno
+class _ValueMeta(type):
+    def __call__(cls, *args, **kwargs):
+        call_site = call_site_of(sys._getframe(1), cls.__name__)
 
         dynamic_function = local_storage().active_dynamic_function()
-        if not dynamic_function.has_value(call_line):
+        instance = dynamic_function.get_value(call_site)
+        if instance is None:
             instance = super(_ValueMeta, cls).__call__(*args, **kwargs)
-            dynamic_function.add_value(call_line, instance)
+            dynamic_function.add_value(call_site, instance)
+            return instance
 
-        return dynamic_function.get_value(call_line)
+        # noinspection PyProtectedMember
+        instance._rerender(*args, **kwargs)
+        return instance
 
 
 class Value(Generic[T], metaclass=_ValueMeta):
@@ -56,13 +101,23 @@ class Value(Generic[T], metaclass=_ValueMeta):
         self._thread = threading.current_thread()
 
     def get(self) -> T:
+        _track_read(self)
+        return self._read()
+
+    def _read(self) -> T:
         return self._value
 
+    def _rerender(self, *args, **kwargs) -> None:
+        """
+        Called with the constructor arguments when the dynamic function which owns the value is rendered again.
+        """
+        pass
+
     def get_old(self) -> T | None:
         return self._old_value
 
     def set(self, value: T) -> None:
-        if self._thread != threading.current_thread():
+        if not self._can_be_set_from_current_thread():
             logger.error("Value was created in thread %s", self._thread)
             logger.error("Value was set in thread %s", threading.current_thread())
             logger.error("Do not set the value from a different thread than it was created in")
@@ -74,6 +129,35 @@ class Value(Generic[T], metaclass=_ValueMeta):
         self._old_value = self._value
         self._value = value
 
+        if defer_notification(self):
+            # A batch is open, the subscribers are notified once it is done
+            return
+
+        self._notify()
+
+    def _can_be_set_from_current_thread(self) -> bool:
+        current_thread = threading.current_thread()
+        if current_thread is self._thread:
+            return True
+        app = self._local_storage.app
+        if app is None:
+            return False
+        # Timers and the results of resources are applied on the event loop thread while holding the render lock of
+        # the session. Async event handlers and tasks do not hold it, between two awaits they may change a value
+        # while a render runs in the executor. The change invalidates that render, so its result is dropped.
+        if current_thread is app.event_loop_thread:
+            return True
+        # Dynamic functions and event handlers run in the render executor of the app while they hold the render lock
+        session_id = self._local_storage.active_session_id
+        if session_id is None:
+            return False
+        try:
+            return app.session_collector.get(session_id).render_lock.locked()
+        except ValueError:
+            # The session was removed
+            return False
+
+    def _notify(self) -> None:
         # Cleanup old callbacks
         for _on_destroy_callback in self._on_destroy_callbacks:
             _on_destroy_callback(self)
@@ -87,37 +171,61 @@ class Value(Generic[T], metaclass=_ValueMeta):
                 self._on_destroy_callbacks.append(destroy_cb)
 
     def __call__(self) -> T:
-        if self._was_called_in_dynamic_function():
+        if _track_read(self):
+            # The value is read by a computed value, which takes care of the re-render
+            return self._read()
+        elif is_dynamic_function_code(sys._getframe(1).f_code):
             session = self._local_storage.active_session()
             session.rerender_on_change(self._local_storage.active_dynamic_function_id, self)
-            return self._value
+            return self._read()
         else:
             logger.error(
                 "It looks like you are trying to use a Value outside of a reactive function. "
                 "Try using .get() instead of calling the value. ",
                 stack_info=True,
             )
-            return self._value
+            return self._read()
 
-    @staticmethod
-    def _was_called_in_dynamic_function() -> bool:
-        back = inspect.currentframe().f_back.f_back
-        called_function_name = back.f_code.co_name
-        globs = back.f_globals
+    def bind_text(self, transform: Callable[[T], Any] = str) -> span:
+        """
+        Display the value in a span element. When the value changes, only the text of the span is updated, the
+        dynamic function is not called again.
+        :param transform: Converts the value into the text which is displayed.
+        :return: The span element.
+        """
+        binding_id = self._register_binding(None, transform)
+        return span(str(transform(self._read())), data_bind_text=binding_id)
 
-        if called_function_name not in globs:
-            # The get function was called in a function that was defined inside a function.
-            # By definition, these functions cannot be dynamic functions
-            return False
-        calling_function = globs[called_function_name]
-        return hasattr(calling_function, "is_dynamic_function")
+    def bind_attr(self, attribute: str, transform: Callable[[T], Any] = lambda value: value) -> attr:
+        """
+        Bind the value to an attribute of the current element. When the value changes, only the attribute is
+        updated, the dynamic function is not called again. False and None remove the attribute.
+        :param attribute: The name of the attribute, the same shorthands as in dominate (cls, data_*, ...) are allowed.
+        :param transform: Converts the value into the value of the attribute.
+        :return: The attributes, which are added to the element of the current context.
+        """
+        attribute = dom_tag.clean_attribute(attribute)
+        binding_id = self._register_binding(attribute, transform)
+        return attr(**{attribute: transform(self._read()), f"data-bind-attr-{attribute}": binding_id})
+
+    def _register_binding(self, attribute: str | None, transform: Callable[[T], Any]) -> str:
+        dynamic_function_id = self._local_storage.active_dynamic_function_id
+        dynamic_function = self._local_storage.active_dynamic_function()
+        binding_id = dynamic_function.register_binding(self, attribute, transform)
+        self._local_storage.active_session().update_bindings_on_change(dynamic_function_id, self)
+        return binding_id
 
     def on_update(self, cb: Callable[[Value[T]], DestroyCb | None]) -> ValueSubscription:
         """
         This function is called when the value is updated
         """
         self._on_update_callbacks.append(cb)
-        return ValueSubscription(lambda: self._on_update_callbacks.remove(cb))
+        return ValueSubscription(lambda: self._remove_update_callback(cb))
+
+    def _remove_update_callback(self, cb: Callable[[Value[T]], DestroyCb | None]) -> None:
+        # The callbacks may have already been removed by destroy
+        if cb in self._on_update_callbacks:
+            self._on_update_callbacks.remove(cb)
 
     def destroy(self) -> None:
         for cb in self._on_destroy_callbacks:
@@ -138,7 +246,9 @@ def on_update(
 
         dynamic_function = local_storage().active_dynamic_function()
         if dynamic_function.is_first_call:
-            value.on_update(inner)
+            subscription = value.on_update(inner)
+            # The value may outlive the dynamic function, if it was passed as an argument
+            dynamic_function.on_unmount(subscription.unsubscribe)
 
         return inner
 
@@ -1,6 +1,43 @@
-from ._base_theme import theme_factory
-from .chota import theme_chota
-from .milligram import theme_milligram
-from .picnic import theme_picnic
-from .pico import theme_pico
-from .water import theme_water
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from ._base_theme import theme_factory, stylesheets, prefetch_themes
+    from ._theme_cache import configure_theme_cache
+    from .chota import theme_chota
+    from .milligram import theme_milligram
+    from .picnic import theme_picnic
+    from .pico import theme_pico
+    from .water import theme_water
+
+# The route the app serves the style sheets of the themes under
+STYLE_SHEET_ROUTE = "/api/better-shiny-themes"
+
+# The themes are imported when they are first accessed, that way httpx is only imported by apps which use a theme
+_lazy_attributes = {
+    "theme_factory": "._base_theme",
+    "stylesheets": "._base_theme",
+    "prefetch_themes": "._base_theme",
+    "configure_theme_cache": "._theme_cache",
+    "theme_chota": ".chota",
+    "theme_milligram": ".milligram",
+    "theme_picnic": ".picnic",
+    "theme_pico": ".pico",
+    "theme_water": ".water",
+}
+
+__all__ = list(_lazy_attributes)
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _lazy_attributes:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_lazy_attributes[name], __name__), name)
+    # Later accesses find the attribute in the module and do not call __getattr__ again
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted({*globals(), *_lazy_attributes})
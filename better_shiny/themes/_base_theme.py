@@ -1,18 +1,46 @@
-import functools
+from typing import Callable, TypeVar, Iterable
 
-import httpx
-from dominate.tags import style
-from dominate.util import raw
-from httpx._types import URLTypes
+from dominate.tags import link
 
+from . import STYLE_SHEET_ROUTE
+from ._theme_cache import theme_cache
 
-@functools.lru_cache(maxsize=100)
-def fetch_text(url: URLTypes) -> str:
-    response = httpx.get(url)
-    response.raise_for_status()
-    return response.text
+T = TypeVar("T", bound=Callable)
 
 
-def theme_factory(theme_url: URLTypes) -> style:
-    style_sheet = fetch_text(theme_url)
-    return style(raw(style_sheet))
+def fetch_text(url: str) -> str:
+    return theme_cache.get(url)
+
+
+def theme_factory(theme_url: str) -> link:
+    """
+    Link the style sheet, which is served by the app under a content hashed url. Browsers cache it, so the style sheet
+    is not sent again on every page load and switching themes only sends the new link.
+    Until the style sheet is in the theme cache, the link points to its original url.
+    """
+    name = theme_cache.asset_name(theme_url)
+    return link(rel="stylesheet", href=f"{STYLE_SHEET_ROUTE}/{name}" if name is not None else theme_url)
+
+
+def stylesheets(*urls: str) -> Callable[[T], T]:
+    """
+    Declare the style sheets a theme uses, that way they can be prefetched when the app starts.
+    """
+    def wrapper(fn: T) -> T:
+        fn.stylesheet_urls = urls
+        return fn
+
+    return wrapper
+
+
+async def prefetch_themes(themes: Iterable[Callable | str]) -> None:
+    """
+    Load the style sheets of the themes (functions declared with @stylesheets, or urls) into the theme cache.
+    """
+    urls = []
+    for theme in themes:
+        if isinstance(theme, str):
+            urls.append(theme)
+        else:
+            urls.extend(getattr(theme, "stylesheet_urls", ()))
+    await theme_cache.prefetch(urls)
@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Set
+
+import httpx
+
+from .._local_storage import local_storage
+from ..utils import create_logger
+from ..utils.tasks import run_in_event_loop
+
+logger = create_logger(__name__)
+
+
+def _default_directory() -> Path:
+    directory = os.environ.get("BETTER_SHINY_THEME_CACHE")
+    if directory:
+        return Path(directory)
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "better_shiny" / "themes"
+
+
+def _default_offline() -> bool:
+    return os.environ.get("BETTER_SHINY_OFFLINE", "").lower() in ("1", "true", "yes")
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+class ThemeCache:
+    """
+    Caches the style sheets of the themes in memory and on disk, that way they are only downloaded once and not every
+    time a worker starts. Cached style sheets are revalidated (ETag / Last-Modified) when they are prefetched.
+    In offline mode, the network is never used and only the style sheets in the directory are served. Point the
+    directory to a folder which is shipped with the app to serve vendored copies.
+    """
+
+    def __init__(self, directory: str | Path | None = None, offline: bool | None = None):
+        self.directory = Path(directory) if directory is not None else _default_directory()
+        self.offline = offline if offline is not None else _default_offline()
+        self._texts: Dict[str, str] = {}
+        # The style sheets served by the app, by their content hashed file name
+        self._assets: Dict[str, str] = {}
+        self._asset_names: Dict[str, str] = {}
+        self._hashed_files: Dict[Path, float] = {}
+        # The modification time of the directory when the style sheets in it were last added to the assets
+        self._indexed_directory: int | None = None
+        # The style sheets which are downloaded in the background, because a theme was rendered before they were cached
+        self._downloading: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def configure(self, directory: str | Path | None = None, offline: bool | None = None) -> None:
+        if directory is not None:
+            self.directory = Path(directory)
+        if offline is not None:
+            self.offline = offline
+        # The style sheets in memory may come from the old directory
+        self._texts.clear()
+        self._asset_names.clear()
+        self._hashed_files.clear()
+        self._indexed_directory = None
+
+    def get(self, url: str) -> str:
+        """
+        The style sheet at the url, downloaded only if it is neither in memory nor on disk.
+        """
+        text = self._texts.get(url)
+        if text is not None:
+            return text
+
+        text = self._read(url)
+        if text is None:
+            if self.offline:
+                raise RuntimeError(
+                    f"The style sheet {url} is not in the theme cache {self.directory} and the theme cache is offline"
+                )
+            logger.info(f"Downloading the style sheet {url}, prefetch the theme to avoid the delay")
+            response = httpx.get(url)
+            response.raise_for_status()
+            text = response.text
+            self._write(url, text, response.headers)
+
+        self._texts[url] = text
+        return text
+
+    def asset_name(self, url: str) -> str | None:
+        """
+        The file name the style sheet at the url is served under. It contains the hash of the content, so browsers can
+        cache the style sheet forever. Themes are rendered while a page or dynamic function renders, so the style
+        sheet is never downloaded here.
+        :return: None if the style sheet is neither in memory nor on disk. It is downloaded in the background then.
+        """
+        name = self._asset_names.get(url)
+        if name is not None:
+            return name
+
+        text = self._texts.get(url)
+        if text is None:
+            text = self._read(url)
+        if text is None:
+            self._download_in_background(url)
+            return None
+
+        self._texts[url] = text
+        name = f"{_content_hash(text)}.css"
+        self._assets[name] = text
+        self._asset_names[url] = name
+        return name
+
+    def _download_in_background(self, url: str) -> None:
+        if self.offline:
+            logger.error(f"The style sheet {url} is not in the theme cache {self.directory}, which is offline")
+            return
+        if local_storage().app is None or local_storage().app.event_loop is None:
+            # No app is running, the style sheet is loaded from its original url
+            return
+        with self._lock:
+            if url in self._downloading:
+                return
+            self._downloading.add(url)
+        logger.info(f"Downloading the style sheet {url} in the background, prefetch the theme to serve it right away")
+
+        async def download() -> None:
+            try:
+                await self.prefetch([url])
+            finally:
+                with self._lock:
+                    self._downloading.discard(url)
+
+        run_in_event_loop(download())
+
+    def get_asset(self, name: str) -> str | None:
+        """
+        The style sheet with the content hashed file name, None if it is unknown.
+        """
+        text = self._assets.get(name)
+        if text is None and self._index_directory():
+            text = self._assets.get(name)
+        return text
+
+    def _index_directory(self) -> bool:
+        """
+        Add the style sheets in the directory to the assets, another worker of the app may have downloaded them and
+        rendered the link. The directory is only scanned again if files were added or replaced since the last scan,
+        so requests for unknown names only cost a stat of the directory. Files which did not change since they were
+        hashed are skipped.
+        :return: False if the directory did not change.
+        """
+        try:
+            modified = self.directory.stat().st_mtime_ns
+        except OSError:
+            return False
+        if modified == self._indexed_directory:
+            return False
+        self._indexed_directory = modified
+
+        for path in self.directory.glob("*.css"):
+            try:
+                file_modified = path.stat().st_mtime
+                if self._hashed_files.get(path) == file_modified:
+                    continue
+                cached_text = path.read_text(encoding="utf-8")
+            except OSError:
+                continue
+            self._hashed_files[path] = file_modified
+            self._assets[f"{_content_hash(cached_text)}.css"] = cached_text
+        return True
+
+    async def prefetch(self, urls: Iterable[str]) -> None:
+        """
+        Load the style sheets into memory, downloading them if they are missing and revalidating the cached ones.
+        Errors are logged, a style sheet which cannot be revalidated is served from the disk.
+        """
+        urls = list(dict.fromkeys(urls))
+        # Index the style sheets on disk once when the app starts, not when the first one is requested
+        await asyncio.to_thread(self._index_directory)
+        if self.offline:
+            for url in urls:
+                text = await asyncio.to_thread(self._read, url)
+                if text is None:
+                    logger.error(f"The style sheet {url} is not in the theme cache {self.directory}")
+                else:
+                    self._texts[url] = text
+            return
+
+        async with httpx.AsyncClient() as client:
+            await asyncio.gather(*(self._prefetch_url(client, url) for url in urls))
+
+    async def _prefetch_url(self, client: httpx.AsyncClient, url: str) -> None:
+        text = await asyncio.to_thread(self._read, url)
+        metadata = await asyncio.to_thread(self._read_metadata, url) if text is not None else {}
+        headers = {}
+        if metadata.get("etag"):
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified"):
+            headers["If-Modified-Since"] = metadata["last_modified"]
+
+        try:
+            response = await client.get(url, headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+                text = response.text
+                await asyncio.to_thread(self._write, url, text, response.headers)
+        except httpx.HTTPError as e:
+            logger.error(f"Could not prefetch the style sheet {url}: {e}")
+
+        if text is not None:
+            self._texts[url] = text
+
+    def _path(self, url: str) -> Path:
+        return self.directory / hashlib.sha256(url.encode()).hexdigest()[:32]
+
+    def _read(self, url: str) -> str | None:
+        try:
+            return self._path(url).with_suffix(".css").read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def _read_metadata(self, url: str) -> Dict[str, str]:
+        try:
+            return json.loads(self._path(url).with_suffix(".json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, url: str, text: str, headers: httpx.Headers) -> None:
+        metadata = {"url": url, "etag": headers.get("etag"), "last_modified": headers.get("last-modified")}
+        path = self._path(url)
+        try:
+            with self._lock:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                # Write to a temporary file first, so other workers never read a partially written style sheet
+                for suffix, content in ((".css", text), (".json", json.dumps(metadata))):
+                    temporary_path = path.with_suffix(f"{suffix}.{os.getpid()}.tmp")
+                    temporary_path.write_text(content, encoding="utf-8")
+                    os.replace(temporary_path, path.with_suffix(suffix))
+        except OSError as e:
+            # The style sheet is still cached in memory
+            logger.warning(f"Could not write the style sheet {url} to the theme cache {self.directory}: {e}")
+
+
+theme_cache = ThemeCache()
+
+
+def configure_theme_cache(directory: str | Path | None = None, offline: bool | None = None) -> None:
+    """
+    Change the directory of the theme cache or enable the offline mode. Defaults to the environment variables
+    BETTER_SHINY_THEME_CACHE (~/.cache/better_shiny/themes if not set) and BETTER_SHINY_OFFLINE.
+    """
+    theme_cache.configure(directory, offline)
@@ -1,7 +1,10 @@
 from dominate.tags import html_tag
 
-from better_shiny.themes._base_theme import theme_factory
+from better_shiny.themes._base_theme import theme_factory, stylesheets
 
+STYLESHEET_URL = "https://unpkg.com/chota@0.9.2/dist/chota.min.css"
 
+
+@stylesheets(STYLESHEET_URL)
 def theme_chota() -> html_tag:
-    return theme_factory("https://unpkg.com/chota@0.9.2/dist/chota.min.css")
+    return theme_factory(STYLESHEET_URL)
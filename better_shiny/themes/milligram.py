@@ -1,12 +1,18 @@
 from dominate.util import container
 
-from better_shiny.themes._base_theme import theme_factory
+from better_shiny.themes._base_theme import theme_factory, stylesheets
 
+STYLESHEET_URLS = (
+    "https://fonts.googleapis.com/css?family=Roboto:300,300italic,700,700italic",
+    "https://cdnjs.cloudflare.com/ajax/libs/normalize/8.0.1/normalize.min.css",
+    "https://cdnjs.cloudflare.com/ajax/libs/milligram/1.4.1/milligram.min.css",
+)
 
+
+@stylesheets(*STYLESHEET_URLS)
 def theme_milligram() -> container:
     with container() as c:
-        theme_factory("https://fonts.googleapis.com/css?family=Roboto:300,300italic,700,700italic")
-        theme_factory("https://cdnjs.cloudflare.com/ajax/libs/normalize/8.0.1/normalize.min.css")
-        theme_factory("https://cdnjs.cloudflare.com/ajax/libs/milligram/1.4.1/milligram.min.css")
+        for url in STYLESHEET_URLS:
+            theme_factory(url)
 
     return c
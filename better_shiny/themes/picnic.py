@@ -1,7 +1,10 @@
 from dominate.tags import html_tag
 
-from better_shiny.themes._base_theme import theme_factory
+from better_shiny.themes._base_theme import theme_factory, stylesheets
 
+STYLESHEET_URL = "https://cdnjs.cloudflare.com/ajax/libs/picnic/7.1.0/picnic.min.css"
 
+
+@stylesheets(STYLESHEET_URL)
 def theme_picnic() -> html_tag:
-    return theme_factory("https://cdnjs.cloudflare.com/ajax/libs/picnic/7.1.0/picnic.min.css")
+    return theme_factory(STYLESHEET_URL)
@@ -2,12 +2,15 @@ import dominate.util
 from dominate.tags import html_tag, style
 from dominate.util import raw
 
-from better_shiny.themes._base_theme import theme_factory
+from better_shiny.themes._base_theme import theme_factory, stylesheets
 
+STYLESHEET_URL = "https://cdn.jsdelivr.net/npm/@picocss/pico@1/css/pico.min.css"
 
+
+@stylesheets(STYLESHEET_URL)
 def theme_pico() -> html_tag:
     with dominate.util.container() as container:
-        theme_factory("https://cdn.jsdelivr.net/npm/@picocss/pico@1/css/pico.min.css")
+        theme_factory(STYLESHEET_URL)
         style(
             raw(
                 """
@@ -1,7 +1,10 @@
 from dominate.tags import html_tag
 
-from better_shiny.themes import theme_factory
+from better_shiny.themes._base_theme import theme_factory, stylesheets
 
+STYLESHEET_URL = "https://cdn.jsdelivr.net/npm/water.css@2/out/water.css"
 
+
+@stylesheets(STYLESHEET_URL)
 def theme_water() -> html_tag:
-    return theme_factory("https://cdn.jsdelivr.net/npm/water.css@2/out/water.css")
+    return theme_factory(STYLESHEET_URL)
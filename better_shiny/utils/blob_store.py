@@ -0,0 +1,163 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from .logging import create_logger
+
+logger = create_logger(__name__)
+
+# The route the app serves the blobs under
+BLOB_ROUTE = "/api/better-shiny-blobs"
+
+_BLOB_NAME = re.compile(r"[0-9a-f]{32}\.\w+")
+
+
+def _default_directory() -> Path:
+    directory = os.environ.get("BETTER_SHINY_BLOB_STORE")
+    if directory:
+        return Path(directory)
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "better_shiny" / "blobs"
+
+
+class BlobStore:
+    """
+    Content addressed storage for binary data (e.g. images) which is referenced by an url instead of being embedded in
+    the html. The name of a blob contains the hash of its content, so browsers can cache it forever.
+    The blobs are kept in memory and written to a directory which all workers of the app share. The browser requests
+    a blob from any worker, not necessarily the one which rendered the page, and that worker reads it from the disk.
+    The blobs which were least recently used are removed once the total size exceeds the limit, both from memory and
+    from the directory.
+    """
+
+    def __init__(self, max_bytes: int, directory: str | Path | None = None):
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory is not None else _default_directory()
+        self._blobs: OrderedDict[str, bytes] = OrderedDict()
+        self._size = 0
+        # Blobs may be added concurrently in the render executor
+        self._lock = threading.Lock()
+
+    def configure(self, max_bytes: int | None = None, directory: str | Path | None = None) -> None:
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        if directory is not None:
+            self.directory = Path(directory)
+
+    def put(self, data: bytes, extension: str) -> str:
+        """
+        Store the data.
+        :param data: The content of the blob.
+        :param extension: The file extension, which determines the media type the blob is served with.
+        :return: The name of the blob.
+        """
+        name = f"{hashlib.sha256(data).hexdigest()[:32]}.{extension}"
+        if not self._remember(name, data):
+            self._touch(name, data)
+            return name
+        self._write(name, data)
+        return name
+
+    def get(self, name: str) -> bytes | None:
+        with self._lock:
+            data = self._blobs.get(name)
+            if data is not None:
+                self._blobs.move_to_end(name)
+        if data is not None:
+            # Another worker may have removed the file, but the page which links the blob may be served by any worker
+            self._touch(name, data)
+            return data
+
+        data = self._read(name)
+        if data is not None:
+            self._remember(name, data)
+        return data
+
+    def url(self, name: str) -> str:
+        return f"{BLOB_ROUTE}/{name}"
+
+    def _remember(self, name: str, data: bytes) -> bool:
+        """
+        Keep the blob in memory.
+        :return: False if it was already in memory.
+        """
+        with self._lock:
+            if name in self._blobs:
+                self._blobs.move_to_end(name)
+                return False
+            self._blobs[name] = data
+            self._size += len(data)
+            # The new blob is kept even if it is larger than the limit, it is removed by the next one
+            while self._size > self.max_bytes and len(self._blobs) > 1:
+                _, evicted = self._blobs.popitem(last=False)
+                self._size -= len(evicted)
+        return True
+
+    def _read(self, name: str) -> bytes | None:
+        # The name comes from the url, it must not point outside the directory
+        if not _BLOB_NAME.fullmatch(name):
+            return None
+        try:
+            data = (self.directory / name).read_bytes()
+        except OSError:
+            return None
+        self._touch(name, data)
+        return data
+
+    def _touch(self, name: str, data: bytes) -> None:
+        # The modification time of the files tells which blobs were used least recently
+        try:
+            os.utime(self.directory / name)
+        except FileNotFoundError:
+            self._write(name, data)
+        except OSError:
+            pass
+
+    def _write(self, name: str, data: bytes) -> None:
+        path = self.directory / name
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first, so other workers never read a partially written blob
+            temporary_path = path.with_name(f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            temporary_path.write_bytes(data)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            # The blob is still served by this worker
+            logger.warning(f"Could not write the blob {name} to the blob store {self.directory}: {e}")
+            return
+        self._prune(path, len(data))
+
+    def _prune(self, written_path: Path, written_size: int) -> None:
+        """
+        Remove the files which were least recently used until the directory fits into the limit again. The file
+        which was just written is kept, like in memory.
+        """
+        files = []
+        try:
+            paths = list(self.directory.iterdir())
+        except OSError:
+            return
+        for path in paths:
+            if path == written_path or not _BLOB_NAME.fullmatch(path.name):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        size = written_size + sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.max_bytes:
+                break
+            try:
+                # Other workers may remove the same files at the same time
+                path.unlink(missing_ok=True)
+            except OSError:
+                continue
+            size -= file_size
+
+
+blob_store = BlobStore(max_bytes=64 * 1024 * 1024)
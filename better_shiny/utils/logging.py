@@ -1,4 +1,5 @@
 import functools
+import inspect
 import logging
 import time
 from typing import Callable, Any
@@ -33,15 +34,28 @@ def log_duration(
     if logger is None:
         logger = _logger
 
-    @functools.wraps(function)
-    def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = function(*args, **kwargs)
-        duration = time.time() - start_time
+    def log(duration: float) -> None:
         if duration > 0.1:
             logger.warning(f"{thing if thing else function.__name__} took {duration:.3f} seconds.")
         else:
             logger.info(f"{thing if thing else function.__name__} took {duration:.3f} seconds.")
+
+    if inspect.iscoroutinefunction(function):
+
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            start_time = time.time()
+            result = await function(*args, **kwargs)
+            log(time.time() - start_time)
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start_time = time.time()
+        result = function(*args, **kwargs)
+        log(time.time() - start_time)
         return result
 
     return wrapper
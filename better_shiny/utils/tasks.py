@@ -0,0 +1,57 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+
+async def _run_detached(coroutine: Coroutine[Any, Any, Any]) -> Any:
+    # noinspection PyProtectedMember
+    from ..reactive.batch import _pending_values
+    # noinspection PyProtectedMember
+    from ..reactive.value import _dependency_tracker
+
+    # The task runs in a copy of the context of the caller. An open batch or dependency tracking only belongs to the
+    # code which is running right now, the task would otherwise defer its notifications to a batch which is done.
+    _pending_values.set(None)
+    _dependency_tracker.set(None)
+    return await coroutine
+
+
+def run_in_event_loop(coroutine: Coroutine[Any, Any, Any]) -> asyncio.Task | Future:
+    """
+    Run the coroutine in a task on the event loop of the app. The task is created with the context of the caller
+    (active session and dynamic function), without the batch of the caller.
+    """
+    from .._local_storage import local_storage
+
+    app = local_storage().app
+    coroutine = _run_detached(coroutine)
+    # Both ways of creating the task copy the context of the caller
+    if threading.current_thread() is app.event_loop_thread:
+        return app.event_loop.create_task(coroutine, context=contextvars.copy_context())
+    # Called by a dynamic function or event handler which runs in the render executor of the app.
+    # Cancelling the future cancels the task as well.
+    return asyncio.run_coroutine_threadsafe(coroutine, app.event_loop)
+
+
+async def call_with_render_lock(func: Callable[[], T]) -> T:
+    """
+    Call the function on the event loop while holding the render lock of the active session, that way it does not
+    run concurrently with the dynamic functions and event handlers of the session in the render executor.
+    """
+    from .._local_storage import local_storage
+
+    storage = local_storage()
+    session_id = storage.active_session_id
+    if session_id is None:
+        return func()
+    try:
+        session = storage.app.session_collector.get(session_id)
+    except ValueError:
+        # The session was removed, nothing renders anymore
+        return func()
+    async with session.render_lock:
+        return func()
@@ -1,29 +1,30 @@
 import asyncio
+from concurrent.futures import Future
 from typing import Callable
 
+from .tasks import run_in_event_loop, call_with_render_lock
 
-def set_timeout(func: Callable[[], None], timeout: float) -> asyncio.Task:
-    from .._local_storage import local_storage
-
-    local = local_storage()
 
+def set_timeout(func: Callable[[], None], timeout: float) -> asyncio.Task | Future:
+    """
+    Call the function once after the timeout. The function is called with the render context (active session and
+    dynamic function) of the caller, while holding the render lock of the session.
+    """
     async def task_wrapper():
         await asyncio.sleep(timeout)
-        func()
-
-    loop = local.app.event_loop
-    return loop.create_task(task_wrapper())
-
+        await call_with_render_lock(func)
 
-def set_interval(func: Callable[[], None], interval: float) -> asyncio.Task:
-    from .._local_storage import local_storage
+    return run_in_event_loop(task_wrapper())
 
-    local = local_storage()
 
+def set_interval(func: Callable[[], None], interval: float) -> asyncio.Task | Future:
+    """
+    Call the function every interval seconds. The function is called with the render context (active session and
+    dynamic function) of the caller, while holding the render lock of the session.
+    """
     async def task_wrapper():
         while True:
             await asyncio.sleep(interval)
-            func()
+            await call_with_render_lock(func)
 
-    loop = local.app.event_loop
-    return loop.create_task(task_wrapper())
+    return run_in_event_loop(task_wrapper())
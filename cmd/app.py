@@ -20,17 +20,13 @@ app = BetterShiny()
 @dynamic()
 def timer(start=0):
     count = reactive.Value(start, "count")
-    double_count = reactive.Value(start * 2, "double")
+    double_count = reactive.Computed(lambda: count.get() * 2, "double")
 
     @reactive.on_mount()
     def on_mount():
-        interval = set_interval(lambda: count.set(count.value_non_reactive + 1), 1)
+        interval = set_interval(lambda: count.set(count.get() + 1), 1)
         return lambda: interval.cancel()
 
-    @reactive.on_update(count)
-    def on_count_change(_):
-        double_count.set(count.value_non_reactive * 2)
-
     return div(p("Count: ", count()), p("Double Count: ", double_count()))
 
 
@@ -0,0 +1,46 @@
+import asyncio
+
+from dominate.tags import *
+from dominate.util import *
+
+from better_shiny import reactive
+from better_shiny.app import BetterShiny
+from better_shiny.reactive import dynamic, on
+
+app = BetterShiny()
+
+
+# Async dynamic functions can await I/O (databases, http requests, ...) without blocking the other sessions.
+# They are rendered after the content of the calling function, the same way lazy functions are.
+# If the search changes while the results are still loading, the old render is cancelled.
+@dynamic()
+async def search_results(search: str):
+    await asyncio.sleep(1)
+    return ul(li(f"{search} {i}") for i in range(5))
+
+
+@dynamic()
+def search():
+    search = reactive.Value("")
+
+    # Event handlers can be async as well
+    async def clear(event, _):
+        await asyncio.sleep(0.1)
+        search.set("")
+
+    with container() as c:
+        with input_(value=search()):
+            on("change", lambda event, _: search.set(event["value"]))
+        with button("Clear"):
+            on("click", handler=clear)
+        search_results(search())
+
+    return c
+
+
+@app.page('/')
+def home():
+    return search()
+
+
+app.run()
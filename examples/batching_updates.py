@@ -0,0 +1,46 @@
+from dominate.tags import *
+from dominate.util import *
+
+from better_shiny import reactive
+from better_shiny.app import BetterShiny
+from better_shiny.reactive import dynamic, on
+
+app = BetterShiny()
+
+
+@dynamic()
+def filters():
+    search = reactive.Value("")
+    sort = reactive.Value("name")
+    page = reactive.Value(1)
+
+    # Every value change would normally notify its subscribers right away.
+    # Inside a batch the subscribers are notified once the batch is done, so the component is only rendered once.
+    @reactive.batch()
+    def reset(event, _):
+        search.set("")
+        sort.set("name")
+        page.set(1)
+
+    def next_page(event, _):
+        # The batch can also be used as a context manager
+        with reactive.batch():
+            page.set(page.get() + 1)
+            sort.set("date")
+
+    with container() as c:
+        with button("Reset"):
+            on("click", handler=reset)
+        with button("Next page"):
+            on("click", handler=next_page)
+        p(f"Search: {search()}, sort: {sort()}, page: {page()}")
+
+    return c
+
+
+@app.page('/')
+def home():
+    return filters()
+
+
+app.run()
@@ -0,0 +1,38 @@
+from dominate.tags import *
+from dominate.util import *
+
+from better_shiny import reactive
+from better_shiny.app import BetterShiny
+from better_shiny.reactive import dynamic, on
+from better_shiny.utils import set_interval
+
+app = BetterShiny()
+
+
+@dynamic()
+def ticker():
+    seconds = reactive.Value(0)
+
+    @reactive.on_mount()
+    def on_mount():
+        interval = set_interval(lambda: seconds.set(seconds.get() + 1), 1)
+        return lambda: interval.cancel()
+
+    with container() as c:
+        # Calling seconds() would render the whole component again every second.
+        # A binding only sends the new text to the browser, the function is not called again.
+        p("Seconds elapsed: ", seconds.bind_text())
+
+        # Attributes can be bound as well. Returning False or None removes the attribute.
+        with p("Every other second this paragraph is highlighted"):
+            seconds.bind_attr("style", lambda value: "color: red;" if value % 2 else None)
+
+    return c
+
+
+@app.page('/')
+def home():
+    return ticker()
+
+
+app.run()
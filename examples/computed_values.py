@@ -0,0 +1,37 @@
+from dominate.tags import *
+from dominate.util import *
+
+from better_shiny import reactive
+from better_shiny.app import BetterShiny
+from better_shiny.reactive import dynamic, on
+
+app = BetterShiny()
+
+
+@dynamic()
+def shopping_cart():
+    prices = reactive.Value([10, 20, 30])
+    discount = reactive.Value(0)
+
+    # A computed value remembers which values it read and caches its result.
+    # It is only calculated again if one of these values changes, not on every render.
+    total = reactive.Computed(lambda: sum(prices()) * (100 - discount()) / 100)
+
+    with container() as c:
+        with button("Add item"):
+            on("click", handler=lambda event, _: prices.set([*prices.get(), 10]))
+        with button("Apply discount"):
+            on("click", handler=lambda event, _: discount.set(10))
+
+        # Computed values are used like any other value
+        p("Total: ", total())
+
+    return c
+
+
+@app.page('/')
+def home():
+    return shopping_cart()
+
+
+app.run()
@@ -0,0 +1,43 @@
+from dominate.tags import *
+from dominate.util import *
+
+from better_shiny import reactive
+from better_shiny.app import BetterShiny
+from better_shiny.reactive import dynamic, on
+
+app = BetterShiny()
+
+
+# A memoized component is not called again when the component using it re-renders, as long as its arguments are
+# equal to the ones of the last call and none of the values it uses changed.
+@dynamic(memo=True)
+def expensive_table(rows):
+    with table() as t:
+        for i in range(rows):
+            tr(td(i), td(i ** 2))
+    return t
+
+
+@dynamic()
+def counter():
+    count = reactive.Value(0)
+    rows = reactive.Value(100)
+
+    with container() as c:
+        with button("Increment"):
+            on("click", lambda e, _: count.set(count.get() + 1))
+        with button("More rows"):
+            on("click", lambda e, _: rows.set(rows.get() + 100))
+        p(f"Count: {count()}")
+        # Only rendered again if the number of rows changed
+        expensive_table(rows())
+
+    return c
+
+
+@app.page('/')
+def home():
+    return counter()
+
+
+app.run()
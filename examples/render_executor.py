@@ -0,0 +1,38 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dominate.tags import *
+from dominate.util import *
+
+from better_shiny import reactive
+from better_shiny.app import BetterShiny
+from better_shiny.reactive import dynamic, on
+
+# Pages, dynamic functions and event handlers run in the thread pool instead of the event loop.
+# That way a slow render or event handler does not block the other sessions.
+app = BetterShiny(render_executor=ThreadPoolExecutor(max_workers=8))
+
+
+@dynamic()
+def report():
+    generated = reactive.Value(0)
+
+    def generate(event, _):
+        # Imagine a slow database query or computation
+        time.sleep(2)
+        generated.set(generated.get() + 1)
+
+    with container() as c:
+        with button("Generate report"):
+            on("click", handler=generate)
+        p(f"Generated {generated()} reports")
+
+    return c
+
+
+@app.page('/')
+def home():
+    return report()
+
+
+app.run()
@@ -0,0 +1,44 @@
+import time
+
+from dominate.tags import *
+from dominate.util import *
+
+from better_shiny import reactive
+from better_shiny.app import BetterShiny
+from better_shiny.reactive import dynamic, on
+
+app = BetterShiny()
+
+
+def load_orders(page: int) -> list[str]:
+    # Imagine a slow database query
+    time.sleep(1)
+    return [f"Order {page * 10 + i}" for i in range(10)]
+
+
+@dynamic()
+def orders():
+    page = reactive.Value(0)
+    # The orders are loaded in the background and the component is rendered again once they arrive.
+    # Whenever one of the dependencies changes, the orders are loaded again and the old request is cancelled.
+    orders = reactive.Resource(lambda: load_orders(page.get()), deps=[page()])
+
+    with container() as c:
+        with button("Next page"):
+            on("click", lambda e, _: page.set(page.get() + 1))
+        if orders.loading:
+            p("Loading...")
+        elif orders.error:
+            p(f"Could not load the orders: {orders.error}")
+        else:
+            ul(li(order) for order in orders.get())
+
+    return c
+
+
+@app.page('/')
+def home():
+    return orders()
+
+
+app.run()
@@ -2,9 +2,13 @@ from dominate.tags import *
 from dominate.util import *
 
 from better_shiny.app import BetterShiny
-from better_shiny.themes import theme_picnic
+from better_shiny.themes import theme_picnic, configure_theme_cache
 
-app = BetterShiny()
+# The style sheets of the themes are cached on disk (~/.cache/better_shiny/themes by default).
+# In offline mode, only the cached style sheets are used, e.g. copies which are shipped with the app.
+configure_theme_cache(directory="./themes", offline=False)
+# Download or revalidate the style sheets in the background when the app starts
+app = BetterShiny(prefetch_themes=[theme_picnic])
 
 
 @app.page('/')
@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+# Measure how long it takes to import the modules of better_shiny, and which heavy optional dependencies they pull in.
+# Every measurement runs in a fresh interpreter, that way modules imported by a previous measurement are not cached.
+# Exits with an error if a module imports one of the heavy dependencies or takes longer than the given limit.
+
+MODULES = [
+    "better_shiny",
+    "better_shiny.reactive",
+    "better_shiny.app",
+    "better_shiny.elements",
+    "better_shiny.themes",
+]
+
+HEAVY_DEPENDENCIES = ["pandas", "matplotlib", "numpy", "httpx"]
+
+MEASURE_TEMPLATE = '''
+import json
+import sys
+import time
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+print(json.dumps({{
+    "duration": duration,
+    "heavy_dependencies": [name for name in {heavy_dependencies!r} if name in sys.modules],
+}}))
+'''
+
+
+def measure(module: str) -> tuple[float, list[str]]:
+    parent_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([parent_folder, os.environ.get("PYTHONPATH", "")])}
+    code = textwrap.dedent(MEASURE_TEMPLATE.format(module=module, heavy_dependencies=HEAVY_DEPENDENCIES))
+    output = json.loads(subprocess.check_output([sys.executable, "-c", code], env=env, text=True))
+    return output["duration"], output["heavy_dependencies"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the modules of better_shiny")
+    parser.add_argument("--runs", type=int, default=5, help="Number of measurements, the best one is reported")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if an import takes longer than this")
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        # The first run compiles the modules, every other run uses the bytecode cache
+        measure(module)
+        results = [measure(module) for _ in range(args.runs)]
+        best = min(result[0] for result in results) * 1000
+        heavy_dependencies = results[0][1]
+
+        print(f"{module}: {best:.1f} ms, heavy dependencies: {', '.join(heavy_dependencies) or 'none'}")
+        if heavy_dependencies or (args.max_ms is not None and best > args.max_ms):
+            failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,68 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+# Measure how long it takes to import an app module which defines many components decorated with @dynamic.
+# Every measurement runs in a fresh interpreter, that way the import of better_shiny itself is included.
+
+COMPONENT_TEMPLATE = '''
+@dynamic()
+def component_{index}(value: int):
+    count = reactive.Value(value)
+    with div() as d:
+        p(count())
+    return d
+'''
+
+MEASURE_TEMPLATE = '''
+import time
+start = time.perf_counter()
+import better_shiny.app
+import better_shiny.reactive
+imported = time.perf_counter()
+import {module}
+registered = time.perf_counter()
+print(imported - start, registered - imported)
+'''
+
+
+def create_app_module(folder: str, components: int) -> str:
+    module = "benchmark_components"
+    with open(os.path.join(folder, f"{module}.py"), "w") as f:
+        f.write("from dominate.tags import div, p\n")
+        f.write("from better_shiny import reactive\n")
+        f.write("from better_shiny.reactive import dynamic\n")
+        for index in range(components):
+            f.write(COMPONENT_TEMPLATE.format(index=index))
+    return module
+
+
+def measure(folder: str, module: str) -> tuple[float, float]:
+    parent_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([folder, parent_folder, os.environ.get("PYTHONPATH", "")])}
+    output = subprocess.check_output(
+        [sys.executable, "-c", textwrap.dedent(MEASURE_TEMPLATE.format(module=module))], env=env, text=True
+    )
+    import_time, registration_time = output.split()
+    return float(import_time), float(registration_time)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the import and registration time of components")
+    parser.add_argument("--components", type=int, default=500, help="Number of components decorated with @dynamic")
+    parser.add_argument("--runs", type=int, default=5, help="Number of measurements, the best one is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        app_module = create_app_module(folder, args.components)
+        # The first run compiles the module, every other run uses the bytecode cache
+        measure(folder, app_module)
+        results = [measure(folder, app_module) for _ in range(args.runs)]
+
+    best_import = min(result[0] for result in results)
+    best_registration = min(result[1] for result in results)
+    print(f"Import of better_shiny: {best_import * 1000:.1f} ms")
+    print(f"Registration of {args.components} components: {best_registration * 1000:.1f} ms")
@@ -0,0 +1,249 @@
+import random
+from html.parser import HTMLParser
+from typing import Any, Callable, Dict, List
+
+from dominate.tags import b, br, button, div, input_, li, p, pre, span, ul
+from dominate.util import container, raw
+
+from better_shiny.communication.dom_patch import diff_virtual_dom, to_virtual_dom
+from better_shiny.communication.messages import Patch
+
+_VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+
+class Node:
+    """
+    A minimal stand-in for the DOM of the browser, the patches are applied to it the way the client applies them.
+    """
+
+    def __init__(self, tag: str | None, attributes: Dict[str, str] | None = None, text: str = "", comment=False):
+        self.tag = tag
+        self.attributes = attributes or {}
+        self.text = text
+        self.comment = comment
+        self.children: List[Node] = []
+
+    @property
+    def is_significant(self) -> bool:
+        if self.comment:
+            return False
+        return self.tag is not None or bool(self.text.strip())
+
+    def significant_children(self) -> List["Node"]:
+        return [child for child in self.children if child.is_significant]
+
+    def canonical(self) -> Any:
+        # Whitespace only text nodes are not addressed by patches, and the whitespace around text depends on whether
+        # it was pretty printed
+        if self.tag is None:
+            return " ".join(self.text.split())
+        return self.tag, self.attributes, [child.canonical() for child in self.significant_children()]
+
+
+class _Parser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.root = Node("#root")
+        self._stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {name: value or "" for name, value in attrs})
+        self._stack[-1].children.append(node)
+        if tag not in _VOID_ELEMENTS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self._stack[-1].children.append(Node(tag, {name: value or "" for name, value in attrs}))
+
+    def handle_endtag(self, tag):
+        while self._stack[-1].tag != tag:
+            self._stack.pop()
+        self._stack.pop()
+
+    def handle_data(self, data):
+        children = self._stack[-1].children
+        if children and children[-1].tag is None and not children[-1].comment:
+            children[-1].text += data
+        else:
+            children.append(Node(None, text=data))
+
+    def handle_comment(self, data):
+        self._stack[-1].children.append(Node(None, text=data, comment=True))
+
+
+def parse(html: str) -> Node:
+    parser = _Parser()
+    parser.feed(html)
+    parser.close()
+    return parser.root
+
+
+def resolve(root: Node, path: List[int]) -> Node:
+    node = root
+    for index in path:
+        node = node.significant_children()[index]
+    return node
+
+
+def apply_patches(root: Node, patches: List[Patch]) -> None:
+    for patch in patches:
+        node = resolve(root, patch.path)
+        if patch.op == "set-attr":
+            node.attributes[patch.name] = patch.value
+        elif patch.op == "remove-attr":
+            del node.attributes[patch.name]
+        elif patch.op == "replace-text":
+            node.text = patch.text
+        elif patch.op == "replace":
+            parent = resolve(root, patch.path[:-1])
+            index = parent.children.index(node)
+            parent.children[index : index + 1] = parse(patch.html).children
+        elif patch.op == "set-html":
+            node.children = parse(patch.html).children
+        elif patch.op == "insert-child":
+            siblings = node.significant_children()
+            index = node.children.index(siblings[patch.index]) if patch.index < len(siblings) else len(node.children)
+            node.children[index:index] = parse(patch.html).children
+        elif patch.op == "remove-child":
+            removed = node.significant_children()[patch.index : patch.index + patch.count]
+            assert len(removed) == patch.count
+            node.children = [child for child in node.children if all(child is not r for r in removed)]
+
+
+def diff(
+    old: Any, new: Any, previous_render: Callable[[str], Any] = lambda _: None, displayed: Any = None
+) -> List[Patch]:
+    """
+    Diff two dominate trees, apply the patches to the old html like the client does and check that the result is the
+    new html.
+    :param displayed: The tree the client displays, if nested dynamic functions were re-rendered on their own.
+    :return: The patches.
+    """
+    patches = diff_virtual_dom(to_virtual_dom(old), to_virtual_dom(new), previous_render)
+    client = parse((displayed if displayed is not None else old).render())
+    apply_patches(client, patches)
+    assert client.canonical() == parse(new.render()).canonical()
+    return patches
+
+
+def ops(patches: List[Patch]) -> List[tuple]:
+    return [(patch.op, patch.path) for patch in patches]
+
+
+def test_unchanged_content_has_no_patches():
+    assert diff(div(p("a"), p("b")), div(p("a"), p("b"))) == []
+
+
+def test_paths_skip_whitespace_only_text():
+    patches = diff(div(p("a"), span("b"), p("c")), div(p("a"), span("b"), p("d")))
+    assert ops(patches) == [("replace-text", [0, 2, 0])]
+    assert patches[0].text == "d"
+
+
+def test_text_is_unescaped():
+    patches = diff(div(p("a")), div(p("x < y & z")))
+    assert patches[0].text == "x < y & z"
+
+
+def test_insertion_in_the_middle_does_not_touch_the_siblings():
+    old = ul(li("a"), li("b"), li("d"), li("e"))
+    new = ul(li("a"), li("b"), li("c1"), li("c2"), li("d"), li("e"))
+    patches = diff(old, new)
+    assert [(patch.op, patch.path, patch.index) for patch in patches] == [("insert-child", [0], 2)]
+
+
+def test_removal_in_the_middle_does_not_touch_the_siblings():
+    old = ul(li("a"), li("b"), li("c"), li("d"), li("e"))
+    new = ul(li("a"), li("e"))
+    patches = diff(old, new)
+    assert [(patch.op, patch.path, patch.index, patch.count) for patch in patches] == [("remove-child", [0], 1, 3)]
+
+
+def test_attributes_are_set_and_removed():
+    patches = diff(div(button("a", cls="x", disabled=True)), div(button("a", cls="y")))
+    assert {(patch.op, patch.name) for patch in patches} == {("set-attr", "class"), ("remove-attr", "disabled")}
+
+
+def test_other_tag_replaces_the_element():
+    assert ops(diff(div(p("a"), br()), div(span("a"), br()))) == [("replace", [0, 0])]
+
+
+def test_opaque_elements_are_replaced_as_a_whole():
+    assert ops(diff(div(pre("a\n  b")), div(pre("a\n  c")))) == [("set-html", [0, 0])]
+    assert ops(diff(div(div(raw("<b>a</b>"))), div(div(raw("<b>b</b>"))))) == [("set-html", [0, 0])]
+
+
+def test_raw_html_at_the_top_level_replaces_everything():
+    old = container(raw("<b>a</b>"), p("a"))
+    new = container(raw("<b>a</b>"), p("b"))
+    assert ops(diff(old, new)) == [("set-html", [])]
+
+
+def test_lazy_outlets_are_skipped():
+    old = div(div(p("a"), id="1_0", data_server_rendered="true", data_lazy="true"))
+    new = div(div(p("b"), id="1_0", data_server_rendered="true", data_lazy="true"))
+    assert diff_virtual_dom(to_virtual_dom(old), to_virtual_dom(new), lambda _: None) == []
+
+
+def outlet(*children: Any) -> div:
+    return div(*children, id="1_0", data_server_rendered="true")
+
+
+def test_outlets_are_diffed_against_their_previous_render():
+    # The nested dynamic function was re-rendered on its own since the parent was rendered
+    previous = to_virtual_dom(p("b"))
+    patches = diff(div(outlet(p("a"))), div(outlet(p("c"))), lambda _: previous, displayed=div(outlet(p("b"))))
+    assert [(patch.op, patch.path, patch.text) for patch in patches] == [("replace-text", [0, 0, 0, 0], "c")]
+
+
+def test_outlets_in_the_suffix_are_addressed_before_the_insertion():
+    previous = to_virtual_dom(p("b"))
+    old = div(p("x"), outlet(p("a")))
+    new = div(p("y"), p("z"), outlet(p("a")))
+    patches = diff(old, new, lambda _: previous, displayed=div(p("x"), outlet(p("b"))))
+    assert ops(patches) == [("replace-text", [0, 1, 0, 0]), ("replace-text", [0, 0, 0]), ("insert-child", [0])]
+
+
+def _random_model(rng: random.Random, depth: int) -> Any:
+    if depth <= 0 or rng.random() < 0.3:
+        return rng.choice(["a", "b", "c & d", "e < f", " ", "<i>raw</i>"])
+    tag = rng.choice(["div", "span", "p", "button", "b", "br", "input"])
+    if tag in ("br", "input"):
+        return tag, {}, []
+    attributes = {name: rng.choice(["x", "y"]) for name in ("cls", "title") if rng.random() < 0.4}
+    return tag, attributes, [_random_model(rng, depth - 1) for _ in range(rng.randrange(5))]
+
+
+def _mutate(rng: random.Random, model: Any, depth: int) -> Any:
+    if rng.random() < 0.1:
+        return _random_model(rng, depth)
+    if isinstance(model, str):
+        return rng.choice([model, "g", "h"])
+    tag, attributes, children = model
+    attributes = dict(attributes)
+    if rng.random() < 0.2:
+        attributes["title"] = rng.choice(["x", "y", "z"])
+    if rng.random() < 0.2:
+        attributes.pop("cls", None)
+    children = [_mutate(rng, child, depth - 1) for child in children]
+    for _ in range(rng.randrange(3)):
+        if children and rng.random() < 0.5:
+            del children[rng.randrange(len(children))]
+        elif tag not in ("br", "input"):
+            children.insert(rng.randrange(len(children) + 1), _random_model(rng, depth - 1))
+    return tag, attributes, children
+
+
+def _build(model: Any) -> Any:
+    if isinstance(model, str):
+        return raw(model) if model.startswith("<") else model
+    tag, attributes, children = model
+    tags = {"div": div, "span": span, "p": p, "button": button, "b": b, "br": br, "input": input_}
+    return tags[tag](*(_build(child) for child in children), **attributes)
+
+
+def test_random_trees():
+    rng = random.Random(0)
+    for _ in range(500):
+        model = ("div", {}, [_random_model(rng, 4) for _ in range(rng.randrange(4))])
+        diff(container(_build(model)), container(_build(_mutate(rng, model, 4))))
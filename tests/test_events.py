@@ -0,0 +1,79 @@
+import re
+import threading
+from typing import Any, Dict, Iterator
+
+import pytest
+from dominate.tags import button, div, p
+from starlette.testclient import TestClient
+
+from better_shiny import reactive
+from better_shiny._local_storage import local_storage
+from better_shiny.app import BetterShiny
+from better_shiny.reactive import dynamic, on
+
+
+@dynamic()
+def controls():
+    armed = reactive.Value(True)
+    deleted = reactive.Value(False)
+
+    with div() as d:
+        with button("Disarm"):
+            if armed():
+                on("click", lambda event, data: armed.set(False))
+        with button("Delete"):
+            on("click", lambda event, data: deleted.set(True))
+        p("Deleted" if deleted() else "Not deleted")
+    return d
+
+
+@pytest.fixture
+def app() -> Iterator[BetterShiny]:
+    # Only one app can exist at a time, the other test modules create theirs when they are imported
+    storage = local_storage()
+    other_app, storage.app = storage.app, None
+    app = BetterShiny(max_frame_rate=None)
+    app.page("/")(controls)
+    yield app
+    storage.app = other_app
+
+
+def receive_json(websocket: Any, timeout: float = 5) -> Dict[str, Any]:
+    # A message which never arrives would block the test forever
+    messages = []
+    thread = threading.Thread(target=lambda: messages.append(websocket.receive_json()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert messages, "No message received"
+    return messages[0]
+
+
+def test_removed_handler_is_detached_before_its_id_is_reused(app: BetterShiny):
+    with TestClient(app) as client:
+        html = client.get("/").text
+        dynamic_function_id = re.search(r'data-server-rendered="true" id="([^"]+)"', html).group(1)
+        assert re.search(r'data-listen-on-event-handler="click-1">Delete', html)
+
+        with client.websocket_connect("/api/better-shiny-communication") as websocket:
+            websocket.send_json(
+                {"type": "event@request", "id": dynamic_function_id, "event_handler_id": "click-0", "event": {}}
+            )
+            patches = receive_json(websocket)["patches"]
+            disarm = [patch for patch in patches if patch["path"] == [0, 0]]
+            delete = [patch for patch in patches if patch["path"] == [0, 1]]
+
+            # The client detaches the handler of an element which loses these attributes
+            assert {patch["name"] for patch in disarm if patch["op"] == "remove-attr"} >= {
+                "data-listen-on-event",
+                "data-listen-on-event-handler",
+            }
+            # Handler ids are positional, the id of the removed handler now belongs to the next one
+            assert {"op": "set-attr", "path": [0, 1], "name": "data-listen-on-event-handler", "value": "click-0"} in (
+                delete
+            )
+
+            websocket.send_json(
+                {"type": "event@request", "id": dynamic_function_id, "event_handler_id": "click-0", "event": {}}
+            )
+            patches = receive_json(websocket)["patches"]
+            assert patches == [{"op": "replace-text", "path": [0, 2, 0], "text": "Deleted"}]
@@ -0,0 +1,71 @@
+import re
+import threading
+from typing import Any, Dict
+
+from dominate.tags import button, div, p
+from starlette.testclient import TestClient
+
+from better_shiny import reactive
+from better_shiny.app import BetterShiny
+from better_shiny.reactive import dynamic, on
+
+app = BetterShiny(max_frame_rate=None)
+fetches = []
+
+
+def fetch() -> int:
+    fetches.append(len(fetches))
+    return len(fetches)
+
+
+@dynamic()
+def refetch_in_batch():
+    resource = reactive.Resource(fetch)
+
+    @reactive.batch()
+    def refetch(event: Any, data: Any) -> None:
+        resource.refetch()
+
+    with div() as d:
+        with button("Refetch"):
+            on("click", refetch)
+        p("Loading" if resource.loading else f"Fetched {resource.get()}")
+    return d
+
+
+@app.page("/")
+def home():
+    return refetch_in_batch()
+
+
+def receive_json(websocket: Any, timeout: float = 5) -> Dict[str, Any]:
+    # A message which never arrives would block the test forever
+    messages = []
+    thread = threading.Thread(target=lambda: messages.append(websocket.receive_json()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert messages, "No message received"
+    return messages[0]
+
+
+def displayed_text(message: Dict[str, Any]) -> str:
+    if message["type"] == "rerender@response":
+        return re.search(r"<p>(.*?)</p>", message["html"]).group(1)
+    return message["patches"][-1]["text"]
+
+
+def test_refetch_in_batch_delivers_result():
+    with TestClient(app) as client:
+        html = client.get("/").text
+        dynamic_function_id = re.search(r'data-server-rendered="true" id="([^"]+)"', html).group(1)
+        with client.websocket_connect("/api/better-shiny-communication") as websocket:
+            # The resource was fetched while the page was rendered
+            assert displayed_text(receive_json(websocket)) == "Fetched 1"
+
+            websocket.send_json(
+                {"type": "event@request", "id": dynamic_function_id, "event_handler_id": "click-0", "event": {}}
+            )
+            text = displayed_text(receive_json(websocket))
+            if text == "Loading":
+                text = displayed_text(receive_json(websocket))
+            assert text == "Fetched 2"